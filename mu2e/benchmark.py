@@ -0,0 +1,233 @@
+"""
+Retrieval benchmark across collections.
+
+Runs a fixed question set (generated with mu2e-eval generate / generate-chATLAS) against
+several collections in parallel and reports for each collection
+  - recall@1/5/20 and MRR of the target documents (documents ranked by their best chunk),
+  - p50/p95/p99 latency of single queries (query embedding + HNSW search, no caches),
+  - number of chunks and size of the HNSW index on disk.
+Every run is appended to a JSONL history (MU2E_BENCHMARK_HISTORY, default
+<data dir>/benchmark_history.jsonl) and compared with the previous run of the same
+collection and question set, so regressions between releases are visible.
+
+    mu2e-eval benchmark --collections default,argo,multi-qa
+"""
+
+import json
+import os
+import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from .utils import get_data_dir, collection_names, index_size_mb
+
+DEFAULT_KS = (1, 5, 20)
+METRICS = ("recall@1", "recall@5", "recall@20", "mrr", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms")
+
+
+def get_history_path():
+    """JSONL file with the results of all benchmark runs."""
+    path = os.getenv('MU2E_BENCHMARK_HISTORY')
+    return Path(path).expanduser() if path else get_data_dir() / "benchmark_history.jsonl"
+
+
+def load_questions(filename='benchmark_questions', question_num=None):
+    """
+    Questions of a benchmark file in the data directory.
+
+    Args:
+        filename (str): file name without .json
+        question_num (int, optional): use entry['qa_pairs'][question_num]['question'] (chATLAS questions)
+
+    Returns:
+        list: (question_id, question, target doc_id) tuples
+    """
+    with open(get_data_dir() / f'{filename}.json', 'r') as file:
+        d = json.load(file)
+    questions = []
+    for entry in d:
+        try:
+            question = entry['question'] if question_num is None else entry['qa_pairs'][question_num]['question']
+        except (IndexError, KeyError, TypeError):
+            continue
+        questions.append((entry['question_id'], question, entry['doc_id']))
+    return questions
+
+
+def percentile(values, q):
+    """q-th percentile (0..100) of a list, None if empty."""
+    import numpy as np
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def _doc_rank(ids, metadatas, target):
+    """1-based rank of a document among the retrieved documents (ordered by their best chunk), inf if missing."""
+    from .evaluation import chunk_doc_id
+    seen = set()
+    for chunk_id, metadata in zip(ids, metadatas):
+        doc_id = chunk_doc_id(chunk_id, metadata)
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        if doc_id == target:
+            return len(seen)
+    return float('inf')
+
+
+def benchmark_collection(name, questions, n_chunks=100, latency_queries=200, ks=DEFAULT_KS):
+    """
+    Benchmark one collection.
+
+    Args:
+        name (str): collection name
+        questions (list): output of load_questions
+        n_chunks (int): retrieved chunks per question, documents beyond them count as not found
+        latency_queries (int): number of questions timed as single queries (0 for all)
+        ks (tuple): k values of recall@k
+
+    Returns:
+        dict: metrics of the collection
+    """
+    from . import search
+    from .collections import get_collection
+    from .evaluation import ExactIndex
+    start = time.time()
+    collection = get_collection(name)
+    load_s = time.time() - start
+    texts = [q for _, q, _ in questions]
+
+    # warm up (model download/load, first remote request) before timing
+    collection.query(query_texts=[texts[0] if texts else "mu2e"], n_results=1, include=[])
+    latencies = []
+    for text in texts[:latency_queries or None]:
+        t = time.perf_counter()
+        collection.query(query_texts=[text], n_results=n_chunks, include=['distances', 'metadatas'])
+        latencies.append(1000 * (time.perf_counter() - t))
+
+    # quality with batched queries
+    results = search.search_many(texts, collection=collection, n_results=n_chunks, include_documents=False)
+    ranks = [_doc_rank(r['ids'], r['metadata'], target) for r, (_, _, target) in zip(results, questions)]
+    metrics = ExactIndex.metrics(ranks, ks)
+    return {"collection": name,
+            "chunks": collection.count(),
+            "index_mb": index_size_mb(collection),
+            "n_questions": metrics.pop("n"),
+            **metrics,
+            "not_found": sum(r == float('inf') for r in ranks),
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p95_ms": percentile(latencies, 95),
+            "latency_p99_ms": percentile(latencies, 99),
+            "latency_mean_ms": sum(latencies) / len(latencies) if latencies else None,
+            "latency_queries": len(latencies),
+            "load_s": load_s,
+            "wall_s": time.time() - start}
+
+
+def _code_version():
+    """Package version and git commit (if running from a checkout)."""
+    try:
+        from importlib.metadata import version
+        package = version('mu2e')
+    except Exception:
+        package = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return package, commit
+
+
+def previous_run(collection, questions_file, history=None):
+    """Last successful history record of a collection and question set, None if there is none."""
+    history = Path(history) if history else get_history_path()
+    if not history.exists():
+        return None
+    last = None
+    with open(history) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if (record.get('collection') == collection and record.get('questions') == questions_file
+                    and not record.get('error')):
+                last = record
+    return last
+
+
+def run_benchmark(collections=None, questions_file='benchmark_questions', question_num=None,
+                  n_chunks=100, latency_queries=200, parallel=True, label=None, history=None):
+    """
+    Benchmark several collections with the same questions and append the results to the history.
+
+    Args:
+        collections (list, optional): collection names. Defaults to all collection_names.
+        questions_file (str): benchmark file in the data directory (without .json)
+        question_num (int, optional): qa_pairs index for chATLAS question files
+        n_chunks (int): retrieved chunks per question
+        latency_queries (int): number of questions timed as single queries (0 for all)
+        parallel (bool): benchmark the collections at the same time (latencies then include the contention)
+        label (str, optional): free text stored with the run, e.g. a release name
+        history (str, optional): history file. Defaults to get_history_path().
+
+    Returns:
+        list: one record per collection (with 'error' if the collection failed)
+    """
+    collections = collections or collection_names
+    questions = load_questions(questions_file, question_num)
+    package, commit = _code_version()
+    run = {"run_id": uuid.uuid4().hex[:12],
+           "timestamp": datetime.now().isoformat(timespec='seconds'),
+           "label": label,
+           "mu2e_version": package,
+           "git_commit": commit,
+           "questions": questions_file if question_num is None else f"{questions_file}[{question_num}]",
+           "n_chunks": n_chunks,
+           "parallel": parallel}
+
+    def one(name):
+        try:
+            return benchmark_collection(name, questions, n_chunks=n_chunks, latency_queries=latency_queries)
+        except Exception as e:
+            return {"collection": name, "error": str(e)}
+
+    history = Path(history) if history else get_history_path()
+    previous = {name: previous_run(name, run['questions'], history) for name in collections}
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(collections)) as executor:
+            results = list(executor.map(one, collections))
+    else:
+        results = [one(name) for name in collections]
+
+    records = [{**run, **result} for result in results]
+    os.makedirs(history.parent, exist_ok=True)
+    with open(history, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print_report(records, previous)
+    print(f"Appended to {history}")
+    return records
+
+
+def print_report(records, previous=None):
+    """Table of benchmark records, with the change to the previous run of each collection."""
+    previous = previous or {}
+    print(f"{'collection':12s} {'chunks':>8s} {'index MB':>9s} " + " ".join(f"{m:>14s}" for m in METRICS))
+    for record in records:
+        if record.get('error'):
+            print(f"{record['collection']:12s} failed: {record['error']}")
+            continue
+        index_mb = f"{record['index_mb']:.1f}" if record['index_mb'] is not None else "?"
+        line = f"{record['collection']:12s} {record['chunks']:8d} {index_mb:>9s}"
+        last = previous.get(record['collection'])
+        for m in METRICS:
+            value = record.get(m)
+            text = "-" if value is None else f"{value:.1f}" if m.endswith('_ms') else f"{value:.3f}"
+            if last and value is not None and last.get(m) is not None:
+                delta = value - last[m]
+                text += f" ({delta:+.1f})" if m.endswith('_ms') else f" ({delta:+.3f})"
+            line += f" {text:>14s}"
+        print(line)
@@ -1,8 +1,9 @@
 # mu2e/cli.py
 import argparse
+from datetime import datetime, timedelta
 from mu2e.docdb import docdb
-from mu2e import search, tools
-from mu2e.collections import get_collection, collection_names
+from mu2e.utils import collection_names
+# search, tools and collections pull in chromadb, they are imported by the commands that need them
 
 def main():
     parser = argparse.ArgumentParser(description='Mu2e DocDB utilities')
@@ -20,22 +21,76 @@ def main():
                                help='Disable AI image descriptions (enabled by default if MU2E_IMAGE_LLM_URL is set)')
     generate_parser.add_argument('--docid', type=int,
                                help='Generate specific document by ID (forces reload)')
+    generate_parser.add_argument('--parse-pool', action='store_true',
+                               help='Parse files in worker processes with timeouts and memory limits (MU2E_PARSE_TIMEOUT, MU2E_PARSE_MAX_RSS_MB)')
+    generate_parser.add_argument('--pipeline', action='store_true',
+                               help='Use the staged concurrent pipeline (fetch, parse, chunk, embed, upsert)')
+    generate_parser.add_argument('--workers', type=str, action='append',
+                               help='Workers per pipeline stage, e.g. --workers fetch=8,parse=4 (implies --pipeline)')
+    generate_parser.add_argument('--queue-size', type=int,
+                               help='Size of the bounded queues between pipeline stages (default: 8)')
+    generate_parser.add_argument('--all-collections', action='store_true',
+                               help='Store every document in all collections in one pass (ignores --collection)')
     
     # Generate from local
     local_parser = subparsers.add_parser('generate-local', help='Generate embeddings from locally stored documents')
+    local_parser.add_argument('--reparse', action='store_true',
+                            help='Parse the stored raw files again (in worker processes) instead of using the stored text')
     
     # Generate from local for all collections
     local_all_parser = subparsers.add_parser('generate-local-all', help='Generate embeddings for all non-default collections from locally stored documents')
     
+    # Compact collection
+    compact_parser = subparsers.add_parser('compact', help='Remove orphaned and stale-version chunks from a collection')
+    compact_parser.add_argument('--dry-run', action='store_true',
+                              help='Only report how many chunks would be removed')
+    compact_parser.add_argument('--batch-size', type=int, default=1000,
+                              help='Number of chunks read/deleted per call (default: 1000)')
+    
+    # Enrichment queue
+    enrich_parser = subparsers.add_parser('enrich', help='Generate the queued image descriptions and update the stored documents')
+    enrich_parser.add_argument('--status', action='store_true',
+                             help='Only show the number of queued documents')
+    enrich_parser.add_argument('--max-jobs', type=int,
+                             help='Stop after this many documents (default: until the queue is empty)')
+    enrich_parser.add_argument('--retry-failed', action='store_true',
+                             help='Queue documents that failed before again')
+    enrich_parser.add_argument('--watch', type=int, metavar='SECONDS',
+                             help='Keep running and check the queue every SECONDS')
+    
+    # Parse cache
+    cache_parser = subparsers.add_parser('parse-cache', help='Inspect or purge the cache of parsed files')
+    cache_parser.add_argument('action', choices=['stats', 'purge'],
+                            help='stats: show size and entries, purge: remove all entries')
+    
+    # Embedding cache
+    embedding_cache_parser = subparsers.add_parser('embedding-cache', help='Inspect or purge the cache of chunk embeddings')
+    embedding_cache_parser.add_argument('action', choices=['stats', 'purge'],
+                                      help='stats: show size and entries per model, purge: remove all entries (of --collection with --only-collection)')
+    embedding_cache_parser.add_argument('--only-collection', action='store_true',
+                                      help='Only purge the embeddings of the model of --collection')
+    
+    # Full-text index
+    fulltext_parser = subparsers.add_parser('fulltext-index', help='Inspect or rebuild the full-text (BM25) index')
+    fulltext_parser.add_argument('action', choices=['stats', 'rebuild'],
+                               help='stats: show indexed chunks per collection, rebuild: re-index --collection')
+    
     # Vector Search
     search_parser = subparsers.add_parser('search', help='Vector search in documents')
-    search_parser.add_argument('query', type=str, help='Search query')
+    search_parser.add_argument('query', type=str, nargs='?', help='Search query')
     search_parser.add_argument('--top', type=int, default=3,
                              help='Number of results to show (default: 3)')
     search_parser.add_argument('--fulltext', action='store_true',
                              help='Use full-text search instead of vector search')
+    search_parser.add_argument('--hybrid', action='store_true',
+                             help='Combine vector and full-text search (reciprocal-rank fusion)')
+    search_parser.add_argument('--rerank', action='store_true',
+                             help='Re-order the results with a cross-encoder (MU2E_RERANK_MODEL)')
     search_parser.add_argument('--days', type=int,
                              help='Limit search to documents from last N days')
+    search_parser.add_argument('--batch', type=str, metavar='FILE',
+                             help='Vector search for every line of FILE (- for stdin) in batched calls, '
+                                  'prints one JSON line per query')
 
     # List command
     list_parser = subparsers.add_parser('list', help='List recent documents')
@@ -46,6 +101,7 @@ def main():
     
     if args.command == 'generate':
         from mu2e.utils import should_add_image_descriptions
+        from mu2e.collections import get_collection
         
         collection = get_collection(args.collection) if args.collection != 'default' else None
         
@@ -53,41 +109,176 @@ def main():
         add_image_descriptions = should_add_image_descriptions() and not args.no_image_descriptions
         
         db = docdb(collection=collection)
+        collections = [get_collection(n) for n in collection_names] if args.all_collections else None
+        if collections:
+            args.collection = ", ".join(collection_names)
+        pool = None
+        if args.parse_pool:
+            from mu2e.parsers.pool import get_parse_pool
+            pool = get_parse_pool()
         
         if args.docid:
             # Generate specific document by ID (always force reload)
             image_text = " (with image descriptions)" if add_image_descriptions else ""
             print(f"Generating {args.collection} embeddings for document {args.docid} (force reload){image_text}...")
-            db.get_parse_store(args.docid, save_raw=True, add_image_descriptions=add_image_descriptions)
+            db.get_parse_store(args.docid, save_raw=True, add_image_descriptions=add_image_descriptions, pool=pool,
+                               collections=collections)
         else:
             # Generate recent documents
             force_text = " (force reload)" if args.force_reload else ""
             image_text = " (with image descriptions)" if add_image_descriptions else ""
             print(f"Generating {args.collection} embeddings for documents from the last {args.days} days{force_text}{image_text}...")
-            db.generate(days=args.days, force_reload=args.force_reload, add_image_descriptions=add_image_descriptions)
+            db.generate(days=args.days, force_reload=args.force_reload, add_image_descriptions=add_image_descriptions,
+                        pipeline=args.pipeline or bool(args.workers), workers=args.workers, queue_size=args.queue_size,
+                        pool=pool, collections=collections)
         
         print("Done!")
         
     elif args.command == 'generate-local':
+        from mu2e import tools
+        from mu2e.collections import get_collection
         collection = get_collection(args.collection) if args.collection != 'default' else None
         print(f"Generating {args.collection} embeddings from locally stored documents...")
-        processed = tools.generate_from_local(collection=collection)
+        pool = None
+        if args.reparse:
+            from mu2e.parsers.pool import get_parse_pool
+            pool = get_parse_pool()
+        processed = tools.generate_from_local(collection=collection, reparse=args.reparse, pool=pool)
         print(f"Done! Processed {processed} documents")
         
     elif args.command == 'generate-local-all':
+        from mu2e import tools
         print("Generating embeddings for all non-default collections from locally stored documents...")
         tools.generate_from_local_all()
         print("Done! Processed all collections")
         
+    elif args.command == 'compact':
+        from mu2e import tools
+        from mu2e.collections import get_collection
+        collection = get_collection(args.collection)
+        print(f"Compacting {args.collection} collection{' (dry run)' if args.dry_run else ''}...")
+        report = tools.compact_collection(collection, batch_size=args.batch_size, dry_run=args.dry_run)
+        print(f"Chunks: {report['chunks_before']} -> {report['chunks_after']} "
+              f"({report['stale']} stale, {report['removed']} removed)")
+        if report['index_mb_before'] is not None and report['index_mb_after'] is not None:
+            print(f"HNSW index of {collection.name}: {report['index_mb_before']:.1f} MB -> "
+                  f"{report['index_mb_after']:.1f} MB")
+        
+    elif args.command == 'enrich':
+        from mu2e.enrichment import get_enrichment_queue
+        queue = get_enrichment_queue()
+        if args.retry_failed:
+            print(f"Re-queued {queue.retry_failed()} failed documents")
+        if args.status:
+            status = queue.status()
+            print(f"Enrichment queue: {status['pending']} pending ({status['waiting']} waiting for a retry), "
+                  f"{status['running']} running, {status['failed']} failed")
+        elif args.watch:
+            import time
+            while True:
+                queue.process(max_jobs=args.max_jobs)
+                time.sleep(args.watch)
+        else:
+            processed = queue.process(max_jobs=args.max_jobs)
+            print(f"Done! Processed {processed} documents")
+        
+    elif args.command == 'parse-cache':
+        from mu2e.parse_cache import get_parse_cache
+        cache = get_parse_cache()
+        if args.action == 'purge':
+            print(f"Removed {cache.purge()} entries from {cache.path}")
+        else:
+            stats = cache.stats()
+            print(f"Parse cache: {stats['path']}")
+            print(f"Entries: {stats['entries']}")
+            print(f"Size: {stats['size_mb']:.1f} MB of {stats['max_mb']:.0f} MB")
+        
+    elif args.command == 'embedding-cache':
+        from mu2e.embedding_cache import get_embedding_cache
+        cache = get_embedding_cache()
+        if cache is None:
+            print("The embedding cache is disabled (MU2E_EMBEDDING_CACHE)")
+        elif args.action == 'purge':
+            model = None
+            if args.only_collection:
+                from mu2e.collections import get_collection
+                model = get_collection(args.collection).embedding_model_id
+            print(f"Removed {cache.purge(model)} entries from {cache.path}")
+        else:
+            stats = cache.stats()
+            print(f"Embedding cache: {stats['path']}")
+            print(f"Entries: {stats['entries']}")
+            for model, n in stats['models'].items():
+                print(f"  {model}: {n}")
+            print(f"Size: {stats['size_mb']:.1f} MB of {stats['max_mb']:.0f} MB")
+        
+    elif args.command == 'fulltext-index':
+        from mu2e.fulltext import get_fulltext_index
+        index = get_fulltext_index()
+        if index is None:
+            print("The full-text index is disabled (MU2E_FULLTEXT_INDEX) or not available")
+        elif args.action == 'rebuild':
+            from mu2e.collections import get_collection
+            print(f"Rebuilding the full-text index of the {args.collection} collection...")
+            print(f"Done! Indexed {index.rebuild(get_collection(args.collection))} chunks")
+        else:
+            stats = index.stats()
+            print(f"Full-text index: {stats['path']}")
+            for name, c in stats['collections'].items():
+                print(f"  {name}: {c['chunks']} chunks{'' if c['complete'] else ' (incomplete, run rebuild)'}")
+        
     elif args.command == 'search':
+        if not args.query and not args.batch:
+            search_parser.error("a query or --batch FILE is required")
+        if args.batch and (args.fulltext or args.hybrid or args.rerank):
+            search_parser.error("--batch only supports vector search")
+        from mu2e import search
+        from mu2e.collections import get_collection
         # Select collection
         collection = get_collection(args.collection) if args.collection != 'default' else None
         
         # Perform search
-        if args.fulltext:
+        if args.batch:
+            import json
+            import sys
+            import time
+            with (sys.stdin if args.batch == '-' else open(args.batch)) as f:
+                queries = [line.strip() for line in f if line.strip()]
+            date_range = {'start': datetime.now() - timedelta(days=args.days)} if args.days else None
+            start = time.time()
+            all_results = search.search_many(queries, collection=collection, n_results=args.top,
+                                             date_range=date_range, include_documents=False)
+            for results in all_results:
+                print(json.dumps({"query": results['query'],
+                                  "results": [{"id": i, "docid": m.get('docid'), "title": m.get('title'),
+                                               "distance": d}
+                                              for i, m, d in zip(results['ids'], results['metadata'],
+                                                                 results['distances'])]}))
+            print(f"{len(queries)} queries in {time.time() - start:.2f}s", file=sys.stderr)
+            return
+        elif args.rerank:
+            mode = "fulltext" if args.fulltext else "hybrid" if args.hybrid else "vector"
+            print(f"Re-ranked {mode} search using {args.collection} for: '{args.query}'")
+            date_range = {'start': datetime.now() - timedelta(days=args.days)} if args.days else None
+            results = search.search_reranked(args.query, collection=collection, n_results=args.top,
+                                             mode=mode, date_range=date_range)
+            t = results['timings']
+            print(f"search {t['search_s']*1000:.0f} ms, re-rank {t['rerank_s']*1000:.0f} ms"
+                  + ("" if results['reranked'] else " (over budget, original order)"))
+            search_type = "Re-ranked"
+        elif args.fulltext:
             print(f"Full-text search for: '{args.query}'")
             results = search.search_fulltext(args.query, n_results=args.top, collection=collection)
             search_type = "Full-text"
+        elif args.hybrid:
+            print(f"Hybrid search using {args.collection} embeddings for: '{args.query}'")
+            date_range = {'start': datetime.now() - timedelta(days=args.days)} if args.days else None
+            results = search.search_hybrid(args.query, collection=collection, n_results=args.top,
+                                           date_range=date_range)
+            t = results['timings']
+            print(f"vector {t['vector_s']*1000:.0f} ms, keyword {t['keyword_s']*1000:.0f} ms, "
+                  f"fusion {t['fusion_s']*1000:.1f} ms, total {t['total_s']*1000:.0f} ms")
+            search_type = "Hybrid"
         else:
             print(f"Vector search using {args.collection} embeddings for: '{args.query}'")
             # Vector search with optional date filtering
@@ -102,7 +293,12 @@ def main():
         for i, (doc_text, distance, doc_id, metadata) in enumerate(zip(
             results['documents'], results['distances'], results['ids'], results['metadata']
         )):
-            print(f"\n{i+1}. Distance: {distance:.3f}")
+            if 'rerank_scores' in results:
+                print(f"\n{i+1}. Re-rank score: {results['rerank_scores'][i]:.3f}")
+            elif 'scores' in results:
+                print(f"\n{i+1}. Score: {results['scores'][i]:.3f}")
+            else:
+                print(f"\n{i+1}. Distance: {distance:.3f}")
             print(f"Title: {metadata.get('title', 'N/A')}")
             print(f"DocID: {metadata.get('docid', 'N/A')}")
             print(f"Link: https://mu2e-docdb.fnal.gov/cgi-bin/sso/ShowDocument?docid={metadata.get('docid', 'N/A')}")
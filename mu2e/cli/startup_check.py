@@ -0,0 +1,131 @@
+"""
+Import time budget for the console-script entry points.
+
+Each entry point module is imported in a fresh interpreter with `python -X importtime`,
+the cumulative time of the imports it triggers is compared against its budget.
+Exits with a non-zero status if an entry point is over budget or can't be imported,
+so it can run in CI:
+
+    python -m mu2e.cli.startup_check
+    python -m mu2e.cli.startup_check --budget mu2e-docdb=0.3 --repeat 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# console scripts (see pyproject.toml) and the import budget of their module in seconds
+ENTRY_POINTS = {
+    'mu2e-docdb': ('mu2e.cli.docdb_cli', 0.5),
+    'mu2e-mcp-server': ('mu2e.mcp.docdb.server_fastmcp', 1.5),
+    'mu2e-chat': ('mu2e.cli.chat_cli', 2.0),
+    'mu2e-slack': ('mu2e.cli.slack_cli', 2.5),
+    'mu2e-web': ('mu2e.web.app', 3.0),
+    'mu2e-eval': ('mu2e.cli.validation_cli', 0.5),
+}
+
+
+def _top_level_imports(code):
+    """
+    Run code with -X importtime.
+
+    Returns:
+        dict: cumulative import time in seconds per top-level module
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue  # header or nested import
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def import_time(module, repeat=3):
+    """
+    Time spent importing a module, without the interpreter startup.
+
+    Args:
+        module (str): module name
+        repeat (int): number of runs, the fastest is returned
+
+    Returns:
+        float: seconds
+    """
+    baseline = set(_top_level_imports("pass"))
+    best = None
+    for _ in range(repeat):
+        times = _top_level_imports(f"import {module}")
+        total = sum(t for name, t in times.items() if name not in baseline)
+        best = total if best is None else min(best, total)
+    return best
+
+
+def check(budgets=None, repeat=3, names=None):
+    """
+    Measure all entry points.
+
+    Args:
+        budgets (dict, optional): budget in seconds per entry point, overrides ENTRY_POINTS
+        repeat (int): runs per entry point
+        names (list, optional): only check these entry points
+
+    Returns:
+        list: (entry point, module, seconds or None, budget, error) per entry point
+    """
+    budgets = budgets or {}
+    results = []
+    for name, (module, budget) in ENTRY_POINTS.items():
+        if names and name not in names:
+            continue
+        budget = budgets.get(name, budget)
+        try:
+            results.append((name, module, import_time(module, repeat=repeat), budget, None))
+        except RuntimeError as e:
+            results.append((name, module, None, budget, str(e)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of the mu2e entry points')
+    parser.add_argument('--budget', type=str, action='append',
+                        help='Budget in seconds per entry point, e.g. --budget mu2e-docdb=0.3,mu2e-web=2')
+    parser.add_argument('--scale', type=float, default=float(os.getenv('MU2E_STARTUP_BUDGET_SCALE', '1')),
+                        help='Multiply all budgets, e.g. for slow CI machines (default: MU2E_STARTUP_BUDGET_SCALE or 1)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per entry point, the fastest counts (default: 3)')
+    parser.add_argument('--only', type=str, action='append',
+                        help='Only check these entry points')
+    args = parser.parse_args()
+
+    budgets = {name: budget for name, (_, budget) in ENTRY_POINTS.items()}
+    for spec in args.budget or []:
+        for item in spec.split(','):
+            name, _, seconds = item.partition('=')
+            if name not in ENTRY_POINTS:
+                parser.error(f"unknown entry point {name}, choices: {', '.join(ENTRY_POINTS)}")
+            budgets[name] = float(seconds)
+    budgets = {name: budget * args.scale for name, budget in budgets.items()}
+
+    failed = 0
+    for name, module, seconds, budget, error in check(budgets, repeat=args.repeat, names=args.only):
+        if error:
+            print(f"FAIL  {name:16s} {module}: {error}")
+            failed += 1
+        elif seconds > budget:
+            print(f"FAIL  {name:16s} {seconds:.2f}s > {budget:.2f}s budget ({module})")
+            failed += 1
+        else:
+            print(f"OK    {name:16s} {seconds:.2f}s <= {budget:.2f}s budget ({module})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,47 @@
 import argparse
-from mu2e import validation
 import asyncio
+# validation pulls in the chat client and pandas, it is imported by the commands that need it
 
 def generate(filename: str = "benchmark_questions", num=None):
+    from mu2e import validation
     val = validation.BenchmarkGenerator()
     val.generate_dataset(num=num)
     val.save(filename)
     
 
-def check_retrieval(collection: str = "default", test_zeros: bool=False):
+def check_retrieval(collection: str = "default", test_zeros: bool=False, exact: bool=False):
+    from mu2e import validation
     val = validation.BenchmarkGenerator()
-    asyncio.run(val.check_retrieval(collection, test_zeros=test_zeros))
+    if exact:
+        val.check_retrieval_exact(collection)
+    else:
+        asyncio.run(val.check_retrieval(collection, test_zeros=test_zeros))
     val.save_retrieval(collection)
     
 
 def chATLAS_generate(filename: str = "chATLAS_questions", num=None):
+    from mu2e import validation
     val = validation.BenchmarkGenerator()
     val.chATLAS_generate_qa_pair(num=num)
     val.save(filename)
     
 
-def check_chATLAS(collection: str = "default", question_num: int=1):
+def check_chATLAS(collection: str = "default", question_num: int=1, exact: bool=False):
+    from mu2e import validation
     val = validation.BenchmarkGenerator()
-    val.check_chATLAS(collection, question_num=question_num)
+    if exact:
+        val.check_retrieval_exact(collection, filename='chATLAS_questions', question_num=question_num)
+    else:
+        val.check_chATLAS(collection, question_num=question_num)
     val.save_retrieval(collection, filename="chATLAS_benchmark_scores")
 
+
+def benchmark(collections=None, filename="benchmark_questions", question_num=None, n_chunks=100,
+              latency_queries=200, parallel=True, label=None):
+    from mu2e.benchmark import run_benchmark
+    run_benchmark(collections=collections, questions_file=filename, question_num=question_num,
+                  n_chunks=n_chunks, latency_queries=latency_queries, parallel=parallel, label=label)
+
     
 def main():
     parser = argparse.ArgumentParser(description='Benchmarking tools')
@@ -47,6 +64,8 @@ def main():
             help='Specify a collection (default if not given)'
         )
     test_parser.add_argument('--test-zeros', action='store_true', help='Test mc for retrievals that score 0')
+    test_parser.add_argument('--exact', action='store_true',
+                             help='Exact ranks with NumPy (MRR, recall@k, HNSW recall) instead of querying Chroma')
 
     chATLAS_test_parser = subparsers.add_parser('test-chATLAS', help='Test qa pairs from chATLAS questions')
     
@@ -65,6 +84,22 @@ def main():
             default='default',    
             help='Specify a collection (default if not given)'
         )
+    chATLAS_test_parser.add_argument('--exact', action='store_true',
+                                     help='Exact ranks with NumPy (MRR, recall@k, HNSW recall) instead of querying Chroma')
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Compare collections: recall@k, MRR, latency, index size')
+    benchmark_parser.add_argument('--collections', type=str, default=None,
+                                  help='Comma separated collections (default: all)')
+    benchmark_parser.add_argument('--filename', default='benchmark_questions', help='Questions file in the data directory')
+    benchmark_parser.add_argument('--rigor', type=str, default=None,
+                                  choices=["early_career", "established_worker", "experienced_professional"],
+                                  help='Use the chATLAS question of this difficulty (for chATLAS question files)')
+    benchmark_parser.add_argument('--n-chunks', type=int, default=100, help='Retrieved chunks per question (default: 100)')
+    benchmark_parser.add_argument('--latency-queries', type=int, default=200,
+                                  help='Number of questions timed as single queries, 0 for all (default: 200)')
+    benchmark_parser.add_argument('--sequential', action='store_true',
+                                  help='Benchmark one collection after the other (latencies without contention)')
+    benchmark_parser.add_argument('--label', type=str, default=None, help='Stored with the results, e.g. a release name')
 
     
     args = parser.parse_args()
@@ -74,14 +109,25 @@ def main():
     elif args.command == 'generate-chATLAS':
         chATLAS_generate(filename=args.filename, num=args.num)
     elif args.command == 'test-retrieval':
-        check_retrieval(args.collection, test_zeros=args.test_zeros)
+        check_retrieval(args.collection, test_zeros=args.test_zeros, exact=args.exact)
     elif args.command == 'test-chATLAS':
         rigor_map = {
             "early_career": 0,
             "established_worker": 1, 
             "experienced_professional": 2
         }
-        check_chATLAS(args.collection, question_num=rigor_map[args.rigor])
+        check_chATLAS(args.collection, question_num=rigor_map[args.rigor], exact=args.exact)
+    elif args.command == 'benchmark':
+        rigor_map = {
+            "early_career": 0,
+            "established_worker": 1, 
+            "experienced_professional": 2
+        }
+        collections = [c.strip() for c in args.collections.split(',') if c.strip()] if args.collections else None
+        benchmark(collections=collections, filename=args.filename,
+                  question_num=rigor_map[args.rigor] if args.rigor else None,
+                  n_chunks=args.n_chunks, latency_queries=args.latency_queries,
+                  parallel=not args.sequential, label=args.label)
 
         
 
@@ -12,6 +12,10 @@ import requests
 import json
 from typing import List
 import os
+import sys
+import threading
+import time
+from .utils import collection_names
 
 _client = None
 def _get_client():
@@ -21,55 +25,190 @@ def _get_client():
         _client = chromadb.PersistentClient(path=get_chroma_path())
     return _client
 
-collection_names = ["default",
-                    "argo",
-                    "multi-qa"]
 
+# Process-wide registry: every collection handle and embedding function (e.g. the
+# multi-qa SentenceTransformer model) is created once and shared by all threads.
+_collections = {}          # (type, user, model, url) -> collection
+_embedding_functions = {}  # (type, user, model, url) -> embedding function
+_load_stats = {}           # (type, user, model, url) -> load time and memory
+_registry_lock = threading.RLock()
 
-def get_collection(collection_name=None, user=None, model=None, url=None):
-    """Get a ChromaDB collection by name or type"""
+
+def _registry_key(collection_name, user=None, model=None, url=None):
+    if collection_name == 'argo':
+        return ('argo', user or os.environ.get('USER'), model or "v3small", url)
+    if collection_name == 'multi-qa':
+        return ('multi-qa', None, None, None)
+    return ('default', None, os.getenv('MU2E_CHROMA_DEFAULT_COLLECTION') or "mu2e_default", None)
+
+
+def _create_collection(key):
+    """Create the embedding function and collection handle of a registry key."""
     client = _get_client()
-    
-    if collection_name in ['argo']:
-        # Return Argo collection with custom embedding function
-        model_ = model or "v3small"
-        collection_name = f"mu2e_argo_{model_}"
-        embedding_func = ArgoEmbeddingFunction(user=user or os.environ.get('USER'), model=model_, url=url)
+    collection_type, user, model, url = key
+    if collection_type == 'argo':
+        embedding_func = ArgoEmbeddingFunction(user=user, model=model, url=url)
         c = client.get_or_create_collection(
-                name=collection_name,
+                name=f"mu2e_argo_{model}",
                 embedding_function=embedding_func
             )
         c.max_input = 8191
-        return c
-    elif collection_name in ['multi-qa']:
-        sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
+        c.embedding_model_id = f"argo:{model}"
+    elif collection_type == 'multi-qa':
+        embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
             model_name="multi-qa-mpnet-base-dot-v1"
         )
-        collection_name = f"mu2e_multi-qa-mpnet"
         c = client.get_or_create_collection(
-                name=collection_name,
-                embedding_function=sentence_transformer_ef
+                name=f"mu2e_multi-qa-mpnet",
+                embedding_function=embedding_func
             )
         c.max_input = 512
-        return c
+        c.embedding_model_id = "sentence-transformers:multi-qa-mpnet-base-dot-v1"
     else:
-        # Return default collection
-        return client.get_or_create_collection(name=os.getenv('MU2E_CHROMA_DEFAULT_COLLECTION') or "mu2e_default")
+        # default collection, uses chroma's default embedding function
+        embedding_func = None
+        c = client.get_or_create_collection(name=model)
+        c.embedding_model_id = "chroma-default:all-MiniLM-L6-v2"
+    c.short_name = collection_type
+    return c, embedding_func
+
+
+def get_collection(collection_name=None, user=None, model=None, url=None):
+    """
+    Get a ChromaDB collection by name or type (the name is kept in collection.short_name).
+
+    The collection and its embedding function are created on first use and shared
+    afterwards, see warmup and registry_stats.
+
+    Args:
+        collection_name (str, optional): one of collection_names, default collection otherwise
+        user (str, optional): Argo user, defaults to $USER
+        model (str, optional): Argo model, defaults to v3small
+        url (str, optional): Argo URL
+
+    Returns:
+        chromadb Collection
+    """
+    key = _registry_key(collection_name, user, model, url)
+    c = _collections.get(key)
+    if c is not None:
+        return c
+    with _registry_lock:
+        if key not in _collections:
+            from .utils import rss_mb
+            rss_before = rss_mb()
+            start = time.time()
+            c, embedding_func = _create_collection(key)
+            rss_after = rss_mb()
+            _embedding_functions[key] = embedding_func
+            _load_stats[key] = {
+                "load_s": time.time() - start,
+                "rss_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                "loaded": time.time(),
+            }
+            _collections[key] = c
+        return _collections[key]
+
+
+def get_embedding_function(collection_name=None, user=None, model=None, url=None):
+    """
+    Shared embedding function of a collection type (None for the default collection,
+    which uses chroma's built-in one). Loads the collection if necessary.
+    """
+    key = _registry_key(collection_name, user, model, url)
+    get_collection(collection_name, user=user, model=model, url=url)
+    return _embedding_functions[key]
+
+
+def warmup(names=None, embed=True):
+    """
+    Load collections and their embedding models ahead of the first request.
+
+    Args:
+        names (list, optional): collection types, defaults to MU2E_WARMUP_COLLECTIONS
+                                (comma separated) or all collection_names
+        embed (bool): also run one query with the local models (default, multi-qa), which
+                      loads the model weights that chroma and sentence-transformers load lazily
+
+    Returns:
+        dict: registry_stats() after loading. Collections that failed to load are listed under "errors".
+    """
+    from .utils import rss_mb
+    if names is None:
+        env = os.getenv('MU2E_WARMUP_COLLECTIONS')
+        names = [n.strip() for n in env.split(',') if n.strip()] if env else collection_names
+    errors = {}
+    for name in names:
+        try:
+            c = get_collection(name)
+            if embed and c.short_name != 'argo':  # argo is a remote API, nothing to load
+                rss_before = rss_mb()
+                start = time.time()
+                c.query(query_texts=["warmup"], n_results=1)
+                rss_after = rss_mb()
+                with _registry_lock:
+                    _load_stats[_registry_key(name)].update(
+                        warmup_s=time.time() - start,
+                        warmup_rss_mb=rss_after - rss_before if rss_before is not None and rss_after is not None else None)
+        except Exception as e:
+            errors[name] = str(e)
+            print(f"Warning: could not load collection {name}: {e}", file=sys.stderr)
+    stats = registry_stats()
+    stats["errors"] = errors
+    return stats
+
+
+def registry_stats():
+    """
+    Returns:
+        dict: process memory (rss_mb) and, per loaded collection, its chroma name, embedding
+              function, load time (load_s) and the memory it added when loaded (rss_mb),
+              and for warmed up collections the time and memory of the first query
+    """
+    from .utils import rss_mb
+    with _registry_lock:
+        collections = []
+        for key, c in _collections.items():
+            embedding_func = _embedding_functions.get(key)
+            entry = {"type": key[0], "name": c.name,
+                     "embedding_function": type(embedding_func).__name__ if embedding_func is not None else "default"}
+            if key[0] == 'argo':
+                entry.update(user=key[1], model=key[2])
+            entry.update(_load_stats.get(key, {}))
+            collections.append(entry)
+    return {"rss_mb": rss_mb(), "collections": collections}
+
 
 class ArgoEmbeddingFunction(EmbeddingFunction):
-    def __init__(self, user: str, model: str = "v3small", url=None):
+    def __init__(self, user: str, model: str = "v3small", url=None,
+                 batch_size=None, max_batch_tokens=None, max_workers=None, timeout=None):
         """
         Custom embedding function for Argo API
+
+        Inputs are split into batches of at most batch_size documents and max_batch_tokens tokens,
+        which are sent concurrently over a pooled session. Requests that fail with 429 or 5xx
+        are retried with exponential backoff (MU2E_HTTP_RETRIES, MU2E_HTTP_BACKOFF).
         
         Args:
             user (str, optional): Username for the API
             model (str, optional): One of 'ada002', 'v3large', 'v3small'
             url (str, optional): Argo URL, defaults to MU2E_ARGO_EMBED_URL or https://apps-dev.inside.anl.gov/argoapi/api/v1/resource/embed/
+            batch_size (int, optional): documents per request. Defaults to MU2E_ARGO_BATCH_SIZE or 64.
+            max_batch_tokens (int, optional): tokens per request. Defaults to MU2E_ARGO_BATCH_TOKENS or 100000.
+            max_workers (int, optional): concurrent requests. Defaults to MU2E_ARGO_WORKERS or 4.
+            timeout (float, optional): seconds per request. Defaults to MU2E_ARGO_TIMEOUT or 120.
         """
         self.user = user
         self.model = model
         self.url = url or os.getenv('MU2E_ARGO_EMBED_URL',"https://apps-dev.inside.anl.gov/argoapi/api/v1/resource/embed/")
         self.headers = {"Content-Type": "application/json"}
+        self.batch_size = batch_size or int(os.getenv('MU2E_ARGO_BATCH_SIZE', '64'))
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv('MU2E_ARGO_BATCH_TOKENS', '100000'))
+        self.max_workers = max_workers or int(os.getenv('MU2E_ARGO_WORKERS', '4'))
+        self.timeout = timeout or float(os.getenv('MU2E_ARGO_TIMEOUT', '120'))
+        self._session = None
+        self._encoding = None
+        self._lock = threading.Lock()
         
         # Set dimensions based on model
         self.dimensions = {
@@ -79,38 +218,82 @@ class ArgoEmbeddingFunction(EmbeddingFunction):
         }
         
         #self.max_input = 8191
-    
-    def __call__(self, input: Documents) -> List[List[float]]:
-        """
-        Generate embeddings for the input documents
-        
-        Args:
-            input: List of documents to embed
-            
-        Returns:
-            List of embeddings (each embedding is a list of floats)
-        """
-        # Prepare the payload
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                from .transport import make_session
+                # POST is not retried by default, but embedding requests are idempotent
+                self._session = make_session(pool_size=self.max_workers, timeout=self.timeout,
+                                             status_forcelist=(429, 500, 502, 503, 504),
+                                             allowed_methods=["POST"])
+            return self._session
+
+    def _count_tokens(self, text):
+        """Token count with the OpenAI tokenizer, or an upper estimate if it is not available."""
+        with self._lock:
+            if self._encoding is None:
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 3 + 1
+
+    def _batches(self, input):
+        """Split the input into (start index, documents) batches bounded in size and tokens."""
+        batches = []
+        start, tokens = 0, 0
+        for i, text in enumerate(input):
+            n = self._count_tokens(text)
+            if i > start and (i - start >= self.batch_size or tokens + n > self.max_batch_tokens):
+                batches.append((start, input[start:i]))
+                start, tokens = i, 0
+            tokens += n
+        if start < len(input):
+            batches.append((start, input[start:]))
+        return batches
+
+    def _embed_batch(self, batch):
         data = {
             "user": self.user,
-            "prompt": input,
+            "prompt": list(batch),
             "model": self.model  # Add model if your API supports it
         }
         
-        payload = json.dumps(data)
-        
         try:
-            # Send POST request
-            response = requests.post(self.url, data=payload, headers=self.headers)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            
-            # Extract embeddings from response
-            result = response.json()
-            embeddings = result["embedding"]
-            
-            return embeddings
-            
+            response = self._get_session().post(self.url, data=json.dumps(data), headers=self.headers)
+            response.raise_for_status()  # Raise an exception for bad status codes (after the retries)
+            embeddings = response.json()["embedding"]
         except requests.exceptions.RequestException as e:
             raise Exception(f"API request failed: {e}")
         except KeyError as e:
             raise Exception(f"Unexpected API response format: {e}")
+        if len(embeddings) != len(batch):
+            raise Exception(f"Unexpected API response format: {len(embeddings)} embeddings for {len(batch)} documents")
+        return embeddings
+    
+    def __call__(self, input: Documents) -> List[List[float]]:
+        """
+        Generate embeddings for the input documents
+        
+        Args:
+            input: List of documents to embed
+            
+        Returns:
+            List of embeddings (each embedding is a list of floats), in the order of the input
+        """
+        batches = self._batches(list(input))
+        if len(batches) <= 1:
+            return [e for _, batch in batches for e in self._embed_batch(batch)]
+
+        from concurrent.futures import ThreadPoolExecutor
+        embeddings = [None] * len(input)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            futures = {executor.submit(self._embed_batch, batch): start for start, batch in batches}
+            for future, start in futures.items():
+                result = future.result()
+                embeddings[start:start + len(result)] = result
+        return embeddings
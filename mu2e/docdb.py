@@ -1,13 +1,23 @@
 import requests
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
 import re
 import io
 from urllib.parse import quote
 from datetime import datetime
 import os
-from .parsers import parser
+import json
+import time
+import shutil
+import threading
+from .parsers import parser, PARSER_MAP
 from .utils import get_data_dir
+from .transport import make_session
+from .spool import SpooledDocument, use_spool
+
+
+class LoginRequiredError(RuntimeError):
+    """Raised if docdb answers with the SSO login page instead of the requested content."""
+
 
 class docdb:
     """
@@ -39,16 +49,25 @@ class docdb:
 	print(doc['topics'])       # List of topics
 	```
     """
-    def __init__(self, base_url : str = None, login : bool = True, collection = None):
+    def __init__(self, base_url : str = None, login : bool = True, collection = None,
+                 pool_size : int = None, timeout : float = None, retries : int = None):
         """
         Args:
             base_url (str, optional): The base URL of the docdb server. Defaults to https://mu2e-docdb.fnal.gov/cgi-bin/sso/.
             collection (chromadb Collection, optinal): Collection that is used
+            pool_size (int, optional): Number of keep-alive connections, see transport.make_session. Defaults to MU2E_HTTP_POOL_SIZE or 10.
+            timeout (float, optional): Per-request timeout in seconds. Defaults to MU2E_HTTP_TIMEOUT or 60.
+            retries (int, optional): Retries (with backoff) on 5xx and connection resets. Defaults to MU2E_HTTP_RETRIES or 3.
         """
         self.cookies = None #{"mellon-sso_mu2e-docdb.fnal.gov": cookie}
         self.base_url = base_url if base_url else "https://mu2e-docdb.fnal.gov/cgi-bin/sso/"
-        self.session = None
+        # one pooled keep-alive session shared by all requests of this client
+        self.session = make_session(pool_size=pool_size, timeout=timeout, retries=retries)
         self.collection = collection # chromadb
+        self._can_login = login
+        # serializes re-logins of the threads sharing self.session, see _relogin
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
         if login:
             missing = []
             if not os.getenv('MU2E_DOCDB_USERNAME'):
@@ -60,14 +79,17 @@ class docdb:
                     f"Missing required environment variables: {', '.join(missing)}. "
                     "Please set these environment variables."
                 )
-            self.login()
+            if not self._load_session():
+                self.login()
 
     def __del__(self):
         if self.session:
             self.session.close()
 
     def login(self):
-        session = requests.Session() # we could change to use session.get instead of requests.get
+        from bs4 import BeautifulSoup
+        session = self.session
+        session.cookies.clear()
         
         # Step 1: Initial request to docdb
         response = session.get(self.base_url)
@@ -87,7 +109,6 @@ class docdb:
         oup = BeautifulSoup(response.text, 'html.parser')
         login_form = soup.find('form')
         if not login_form:
-            session.close()
             raise ValueError("Could not find login form")
         login_url = urljoin('https://pingprod.fnal.gov', login_form['action'])
     
@@ -125,7 +146,112 @@ class docdb:
 
 
         self.cookies = {"mellon-sso_mu2e-docdb.fnal.gov": session.cookies.get('mellon-sso_mu2e-docdb.fnal.gov')}
-        self.session = session
+        self._save_session()
+
+    def _session_cache_path(self):
+        host = re.sub(r'[^A-Za-z0-9.-]', '_', self.base_url.split("//")[-1].split("/")[0])
+        return get_data_dir() / f".docdb_session_{host}.json"
+
+    def _load_session(self):
+        """
+        Restore the SSO session cookies from the on-disk cache (see _save_session).
+
+        The cache is ignored if disabled with MU2E_DOCDB_SESSION_CACHE=false, if it is older than
+        MU2E_DOCDB_SESSION_TTL hours (default: 8) or if one of its cookies expired.
+
+        Returns:
+            bool: True if a cached session was restored
+        """
+        if os.getenv('MU2E_DOCDB_SESSION_CACHE', 'true').lower() != 'true':
+            return False
+        path = self._session_cache_path()
+        try:
+            with open(path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+        now = time.time()
+        ttl = float(os.getenv('MU2E_DOCDB_SESSION_TTL', '8')) * 3600
+        if cache.get('base_url') != self.base_url or now - cache.get('saved', 0) > ttl:
+            return False
+        cookies = cache.get('cookies', [])
+        if not cookies or any(c.get('expires') and c['expires'] < now for c in cookies):
+            return False
+        self.session.cookies.clear()
+        for c in cookies:
+            self.session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'),
+                                     expires=c.get('expires'), secure=c.get('secure', False))
+        self.cookies = {"mellon-sso_mu2e-docdb.fnal.gov": self.session.cookies.get('mellon-sso_mu2e-docdb.fnal.gov')}
+        return True
+
+    def _save_session(self):
+        """Store the session cookies in the data directory, readable by the owner only."""
+        if os.getenv('MU2E_DOCDB_SESSION_CACHE', 'true').lower() != 'true':
+            return
+        cache = {"base_url": self.base_url,
+                 "saved": time.time(),
+                 "cookies": [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+                              "expires": c.expires, "secure": c.secure} for c in self.session.cookies]}
+        path = self._session_cache_path()
+        try:
+            tmp_path = path.with_suffix(".tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write docdb session cache {path}: {e}")
+
+    def _get(self, url, **kwargs):
+        """GET request through the shared session of this client, see _request."""
+        return self._request("GET", url, **kwargs)
+
+    def _request(self, method, url, **kwargs):
+        """
+        Request through the shared session of this client.
+        If docdb answers with the login page, the client logs in again once and repeats the request.
+
+        Args:
+            method (str): http method
+            url (str): url to request
+            **kwargs: passed to requests.Session.request
+
+        Returns:
+            requests.Response
+
+        Raises:
+            RuntimeError: if no response, see _check_respose
+            LoginRequiredError: if the login page is returned after a new login
+        """
+        generation = self._login_generation
+        response = self.session.request(method, url, cookies=self.cookies, **kwargs)
+        try:
+            self._check_respose(response)
+        except LoginRequiredError:
+            if not self._can_login:
+                raise
+            self._relogin(generation)
+            response = self.session.request(method, url, cookies=self.cookies, **kwargs)
+            self._check_respose(response)
+        return response
+
+    def _relogin(self, generation):
+        """
+        Log in again after the session expired. Threads that share the session and hit the
+        expired session at the same time must not run the login flow concurrently (it clears
+        and rebuilds the shared cookie jar), so only the first one logs in. The others wait and
+        then retry with the new cookies.
+
+        Args:
+            generation (int): value of _login_generation before the failed request
+        """
+        with self._login_lock:
+            if self._login_generation != generation:
+                return  # another thread logged in meanwhile
+            print("docdb session expired, logging in again")
+            self.login()
+            self._login_generation += 1
 
     def _get_html(self, doc_id : int):
         """
@@ -141,11 +267,11 @@ class docdb:
             RuntimeError: if no response, see _check_respose
         """
         url_ = f"{self.base_url}ShowDocument?docid={doc_id}"
-        response = requests.get(url_, cookies=self.cookies)
-        self._check_respose(response)
+        response = self._get(url_)
         return response.text
         
     def _parse_list(self, text):
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(text, 'html.parser')
         table = soup.find('table', {'id': 'DocumentTable'})
         if not table:
@@ -194,7 +320,7 @@ class docdb:
         """
         from datetime import datetime
         url_ = f"{self.base_url}ListBy?days={days}"
-        response = requests.get(url_, cookies=self.cookies)
+        response = self._get(url_)
         #print(response.text)
         return self._parse_list(response.text)
 
@@ -234,7 +360,7 @@ class docdb:
             data["aftermonth"] = "---"
             data["afteryear"] = "----"
         #print(data)
-        response = self.session.post(self.base_url+"/Search", data=data, )
+        response = self._request("POST", self.base_url+"/Search", data=data)
         return self._parse_list(response.text)
 
 
@@ -251,6 +377,7 @@ class docdb:
         Raises:
             RuntimeError: if no response, see _check_respose
         """
+        from bs4 import BeautifulSoup
         html = self._get_html(doc_id)
         soup = BeautifulSoup(html, 'html.parser')
         page_title = soup.title.string if soup.title else None
@@ -323,21 +450,23 @@ class docdb:
         
         Raises:
             RuntimeError: if the server response it not valid
-            RuntimeError: if login might be requeired
+            LoginRequiredError: if login is requeired
             
         """
         if(response.ok):
-            #print(response.text)
+            # only html pages can be the login page, don't read (streamed) files here
+            if 'text/html' not in response.headers.get('Content-Type', ''):
+                return
             try:
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(response.text, 'html.parser')
                 page_title = soup.title.string if soup.title else None
-                if page_title:
-                    if page_title == "Select Authentication System":
-                        raise RuntimeError(f"New login required. Log in to {self.base_url} in your browser, use the new cookie (mellon-sso_mu2e-docdb.fnal.gov) in the docdb constructor.")
-            except:
-                pass
+            except Exception:
+                page_title = None
+            if page_title and page_title.strip() == "Select Authentication System":
+                raise LoginRequiredError(f"New login required for {self.base_url}. Check MU2E_DOCDB_USERNAME and MU2E_DOCDB_PASSWORD.")
         else:
-            raise RuntimeError(f"The connection to {response.url} failed with status {response.status_code}:"+response.json())
+            raise RuntimeError(f"The connection to {response.url} failed with status {response.status_code}: "+response.text[:200])
     
     def get_document_url(self, docurl : str):
         """
@@ -347,15 +476,17 @@ class docdb:
             docurl (str): url to the document, this is the same that is also used in the browser.
 
         Returns:
-            dict: with {type, document (io.BytesI)} of the retrived document 
+            dict: with {type, document} of the retrived document. The document is streamed to a
+                  spool file (spool.SpooledDocument), or an io.BytesIO if MU2E_SPOOL is false.
 
         Raises:
             RuntimeError in case of connection issues.
         """
-        response = requests.get(docurl, stream=True, cookies=self.cookies)
-        self._check_respose(response)
+        response = self._get(docurl, stream=True)
         if response.headers['Content-Type'] == 'text/html;charset=utf-8':
-            raise RuntimeError(f"New login required. Log in to {self.base_url} in your browser, use the new cookie (mellon-sso_mu2e-docdb.fnal.gov) in the docdb constructor.")
+            raise LoginRequiredError(f"New login required. Log in to {self.base_url} in your browser, use the new cookie (mellon-sso_mu2e-docdb.fnal.gov) in the docdb constructor.")
+        elif use_spool():
+            doc = SpooledDocument.from_response(response)
         else:
             doc = io.BytesIO(response.content)
         return {"type":response.headers['Content-Type'].split("/")[1], "document":doc}
@@ -375,12 +506,13 @@ class docdb:
         url_ = f"{self.base_url}RetrieveFile?docid={doc_id}&filename={quote(file_name)}&version={version}"
         return self.get_document_url(url_)
 
-    def get(self, doc_id):
+    def get(self, doc_id, meta=None):
         """
         Get the metadata and all documents of from a docdb id.
         
         Args:
             doc_id: The docdb number.
+            meta (dict, optional): Output of get_meta if already retrieved.
 
         Returns:
             A dictionary containing the document's meta data as well as the associated documents. Containing docid_str, type, created, revised_content, revised_meta, title, abstract, files, topics, keyword, docid, version. Returns None if the document doesn't exist.
@@ -388,7 +520,7 @@ class docdb:
         Raises:
             RuntimeError: if no response, see _check_respose
         """
-        out = self.get_meta(doc_id)
+        out = meta if meta is not None else self.get_meta(doc_id)
         if out is None:
             return out
         if 'files' in out:
@@ -397,7 +529,7 @@ class docdb:
                 out['files'][i] = out['files'][i] | doc 
         return out
 
-    def parse_files(self, doc, add_image_descriptions=None):
+    def parse_files(self, doc, add_image_descriptions=None, pool=None, defer_images=None):
         """
         Runs all implemented parsings.
         
@@ -405,21 +537,71 @@ class docdb:
             doc: Document dictionary with files
             add_image_descriptions (bool): Whether to generate AI descriptions for images
                                          If None, uses environment variable settings
+            pool (ParsePool, optional): Parse the files in worker processes with timeouts and memory
+                                        limits (see parsers.pool). If None, the shared pool is used
+                                        if MU2E_PARSE_POOL is true, otherwise files are parsed in this thread.
+            defer_images (bool, optional): Don't generate the image descriptions here, but keep the
+                                           images in the files ('images') for the enrichment queue
+                                           (see enrichment). Defaults to MU2E_ENRICH_ASYNC (true).
+            Parser output is looked up in and added to the parse cache (see parse_cache),
+            unless MU2E_PARSE_CACHE is false. Files that fail (with or without pool) are marked
+            with a 'parse_error'.
         """
         from .utils import should_add_image_descriptions
+        from .parsers.pool import get_parse_pool, use_parse_pool
+        from .parse_cache import get_parse_cache, use_parse_cache
+        from .enrichment import defer_image_descriptions
         
         if add_image_descriptions is None:
             add_image_descriptions = should_add_image_descriptions()
+        if defer_images is None:
+            defer_images = defer_image_descriptions()
+        if pool is None and use_parse_pool():
+            pool = get_parse_pool()
+        cache = get_parse_cache() if use_parse_cache() else None
+
+        def label(i):
+            """name of a file in log messages"""
+            return f"docdb {doc.get('docid')} {doc['files'][i].get('filename', i)}"
+
+        cached = {}
+        keys = {}  # cache keys, every file is hashed once
+        if cache is not None:
+            for i, file in enumerate(doc['files']):
+                if file.get('type') in PARSER_MAP:
+                    keys[i] = cache.key(file['document'], file['type'])
+                    hit = cache.get(file['document'], file['type'], key=keys[i])
+                    if hit is not None:
+                        cached[i] = hit
+
+        if pool is not None:
+            todo = [i for i, file in enumerate(doc['files']) if file.get('type') in PARSER_MAP and i not in cached]
+            results = pool.map([(doc['files'][i]['document'], doc['files'][i]['type'], label(i)) for i in todo])
         
         for i, file in enumerate(doc['files']):
             try:
-                p = parser(file['document'], file['type'])
-                text_out, images = p.get_text()
+                # the parser (and its module) is only created where it is needed
+                if i in cached:
+                    text_out, images = cached[i]
+                elif pool is None or i not in todo:
+                    # in this thread (with a pool, only unsupported types are left, parser raises for them)
+                    text_out, images = parser(file['document'], file['type'], label(i)).get_text()
+                else:
+                    result = results[todo.index(i)]
+                    if isinstance(result, Exception):
+                        raise result
+                    text_out, images = result
+                if cache is not None and i not in cached:
+                    cache.put(file['document'], file['type'], text_out, images, key=keys.get(i))
                 if add_image_descriptions and images:
-                    text_out = p.add_image_descriptions(text_out, images)
+                    if defer_images:
+                        doc['files'][i]['images'] = images
+                    else:
+                        text_out = parser(file['document'], file['type']).add_image_descriptions(text_out, images)
                 doc['files'][i]['text'] = text_out
             except Exception as e:
                 print(e)
+                doc['files'][i]['parse_error'] = str(e)
                 continue
         return doc
   
@@ -431,6 +613,9 @@ class docdb:
         os.makedirs(dir_path, exist_ok=True)
         if 'files' in doc:
             for f in doc['files']:
+                if hasattr(f['document'], 'path'):
+                    shutil.copyfile(f['document'].path, dir_path / f['filename'])
+                    continue
                 with open(dir_path / f['filename'], 'wb') as f_:
                     f_.write(f['document'].getvalue())
 
@@ -448,7 +633,7 @@ class docdb:
         import json
         import os
         doc_filtered = doc.copy()
-        doc_filtered['files'] = [{k: v for k, v in f.items() if k != "document"} for f in doc_filtered['files']]
+        doc_filtered['files'] = [{k: v for k, v in f.items() if k not in {"document", "images"}} for f in doc_filtered['files']]
         
         if path is None:
             path = get_data_dir()
@@ -466,38 +651,127 @@ class docdb:
         #rag.doc_generate_embedding(docid)
         #print(f"Data saved to {full_path}")
     
-    def get_and_parse(self, docid, add_image_descriptions=False):
-        doc_full = self.get(docid)
+    def get_and_parse(self, docid, add_image_descriptions=False, meta=None, pool=None, defer_images=False):
+        doc_full = self.get(docid, meta=meta)
         if doc_full is None:
             return None
-        self.parse_files(doc_full, add_image_descriptions=add_image_descriptions)
+        self.parse_files(doc_full, add_image_descriptions=add_image_descriptions, pool=pool, defer_images=defer_images)
         return doc_full
 
-    def get_parse_store(self, docid, save_raw=False, add_image_descriptions=False):
+    def get_parse_store(self, docid, save_raw=False, add_image_descriptions=False, meta=None, pool=None,
+                        collections=None):
+        """
+        Get, parse and store one document.
+
+        Args:
+            collections (list, optional): store the document in all of these collections (fetched,
+                                          parsed and chunked once, see tools.save_in_collections).
+                                          Defaults to the collection of this client.
+        """
         from mu2e import tools
-        doc_full = self.get_and_parse(docid, add_image_descriptions=add_image_descriptions)
+        from .manifest import get_manifest
+        from .enrichment import get_enrichment_queue
+        # the image descriptions are added by the enrichment queue after storing (unless MU2E_ENRICH_ASYNC=false)
+        doc_full = self.get_and_parse(docid, add_image_descriptions=add_image_descriptions, meta=meta, pool=pool,
+                                      defer_images=None)
         if doc_full is None:
             return None
-        tools.saveInCollection(doc_full, self.collection)
+        collections = collections or [self.collection]
+        tools.save_in_collections(doc_full, collections)
+        for collection in collections:
+            get_manifest(collection).update(doc_full)
+        # queued once, the queue updates the other collections that store the same version
+        get_enrichment_queue().enqueue(doc_full, collections[0])
         if save_raw:
             self.saveMetaJson(doc_full)
             self.saveFiles(doc_full)
         return doc_full
 
-    def generate(self, days=10, force_reload=False, save_raw=True, add_image_descriptions=False):
-        from mu2e import tools
+    def generate(self, days=10, force_reload=False, save_raw=True, add_image_descriptions=False,
+                 pipeline=False, workers=None, queue_size=None, pool=None, collections=None):
+        """
+        Get, parse and store all documents of the last days.
+
+        Args:
+            days (int): number of days to look back
+            force_reload (bool): re-ingest documents that are already in the collection
+            save_raw (bool): also store meta.json and the raw files in the data directory
+            add_image_descriptions (bool): generate AI image descriptions
+            pipeline (bool): use the staged concurrent pipeline (see mu2e.pipeline) instead of
+                             processing one document after the other
+            workers (dict or str, optional): worker count per pipeline stage, e.g. "fetch=8,parse=4"
+            queue_size (int, optional): size of the bounded queues between pipeline stages
+            pool (ParsePool, optional): parse in worker processes, see parse_files. The pipeline
+                                        always uses a pool with one process per parse worker.
+            collections (list, optional): ingest into all of these collections in one pass, every
+                                          document is fetched and parsed once and stored in the
+                                          collections that don't have its version yet.
+                                          Defaults to the collection of this client.
+
+        Returns:
+            dict: pipeline stats if pipeline is True, None otherwise
+        """
+        from .manifest import get_manifest
         latest = self.list_latest(days)
+        if pipeline:
+            from .pipeline import Pipeline
+            p = Pipeline(self, workers=workers, queue_size=queue_size, force_reload=force_reload,
+                         save_raw=save_raw, add_image_descriptions=add_image_descriptions, pool=pool,
+                         collections=collections)
+            return p.run(latest)
+        collections = collections or [self.collection]
+        manifests = [get_manifest(c) for c in collections]
         for doc in latest:
-            if doc['id'] in []:
-                continue
-            doc_ = None
+            meta = None
             if not force_reload:
-                doc_ = tools.load2("mu2e-docdb-"+str(doc['id']), nodb=True, collection=self.collection) # check if we already have this cached
-                if not doc_ is None:
-                    print("mu2e-docdb-"+str(doc['id'])+" - present")
-                else:
-                    print("mu2e-docdb-"+str(doc['id'])+" - get, parse, store...")
-            if doc_ is None:
-                self.get_parse_store(doc['id'], save_raw=save_raw, add_image_descriptions=add_image_descriptions)
-            
-    
+                meta = self.sync_check(doc, manifests)
+                if meta is None:
+                    continue
+            print("mu2e-docdb-"+str(doc['id'])+" - get, parse, store...")
+            self.get_parse_store(doc['id'], save_raw=save_raw, add_image_descriptions=add_image_descriptions, meta=meta, pool=pool,
+                                 collections=self.stale_collections(doc['id'], meta, collections, manifests))
+
+    def sync_check(self, item, manifest):
+        """
+        Decide if a listed document needs to be (re-)ingested, based on the sync manifest.
+        Documents synced after their last listed update are skipped with a dictionary lookup,
+        otherwise the meta data is retrieved and its version compared with the manifest.
+
+        Args:
+            item (dict): list_latest entry
+            manifest (SyncManifest or list): manifest of the target collection, or of several target collections
+
+        Returns:
+            dict: output of get_meta if the document is new or changed (in any of the collections),
+                  None if it is unchanged (or doesn't exist)
+        """
+        manifests = manifest if isinstance(manifest, (list, tuple)) else [manifest]
+        docid = "mu2e-docdb-"+str(item['id'])
+        if all(m.listed_unchanged(item) for m in manifests):
+            print(docid+" - present")
+            return None
+        meta = self.get_meta(item['id'])
+        if meta is None:
+            return None
+        current = [m for m in manifests if m.is_current(docid, meta)]
+        for m in current:
+            m.touch(docid)
+        if len(current) == len(manifests):
+            print(docid+" - present (v"+str(meta['version'])+")")
+            return None
+        return meta
+
+    @staticmethod
+    def stale_collections(docid, meta, collections, manifests):
+        """
+        Collections that don't store the version in meta (all of them if meta is None, e.g. on a forced reload).
+
+        Args:
+            docid (int): docdb id
+            meta (dict or None): output of get_meta/sync_check
+            collections (list): collections
+            manifests (list): their sync manifests
+        """
+        if meta is None:
+            return list(collections)
+        return [c for c, m in zip(collections, manifests) if not m.is_current("mu2e-docdb-"+str(docid), meta)]
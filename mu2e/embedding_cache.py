@@ -0,0 +1,207 @@
+"""
+Persistent cache of chunk embeddings.
+
+Embeddings are stored as float16 blobs in a sqlite database in the data directory
+(embedding_cache.db), keyed by the embedding model (collection.embedding_model_id) and the
+SHA-256 of the chunk text. Re-ingesting an unchanged document, generate-local or
+generate-local-all then only embed the chunks that were not embedded with the same model before.
+The cache is bounded in size (MU2E_EMBEDDING_CACHE_MB), least recently used entries are evicted first.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from .utils import get_data_dir
+import sqlite3  # after utils, which may swap in pysqlite3
+
+
+def text_hash(text):
+    """Cache key of a chunk text."""
+    return hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk cache for embeddings.
+
+    Attributes:
+        path (Path): sqlite file. Defaults to MU2E_EMBEDDING_CACHE_PATH or <data dir>/embedding_cache.db.
+        max_mb (float): size limit of the stored vectors in MB. Defaults to MU2E_EMBEDDING_CACHE_MB or 1024.
+        hits (int): chunks answered from the cache since creation
+        misses (int): chunks not in the cache since creation
+    """
+
+    def __init__(self, path=None, max_mb=None):
+        path = path or os.getenv('MU2E_EMBEDDING_CACHE_PATH')
+        self.path = Path(path) if path else get_data_dir() / "embedding_cache.db"
+        self.max_mb = max_mb or float(os.getenv('MU2E_EMBEDDING_CACHE_MB', '1024'))
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes of stored vectors, computed on first put
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                model TEXT NOT NULL,
+                                hash TEXT NOT NULL,
+                                dim INTEGER NOT NULL,
+                                vector BLOB NOT NULL,
+                                used REAL,
+                                PRIMARY KEY (model, hash))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+        self._conn.commit()
+
+    def get_many(self, model, texts):
+        """
+        Look up the embeddings of chunk texts.
+
+        Args:
+            model (str): embedding model id
+            texts (list): chunk texts
+
+        Returns:
+            list: embedding (list of float) or None per text
+        """
+        import numpy as np
+        keys = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(keys))
+            for i in range(0, len(unique), 500):  # stay below the sqlite variable limit
+                part = unique[i:i + 500]
+                rows = self._conn.execute(f"SELECT hash, dim, vector FROM embeddings WHERE model=? "
+                                          f"AND hash IN ({','.join('?' * len(part))})", [model] + part)
+                for key, dim, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float16, count=dim).astype(np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET used=? WHERE model=? AND hash=?",
+                                       [(now, model, k) for k in found])
+                self._conn.commit()
+            out = [found.get(k) for k in keys]
+            n_hits = sum(e is not None for e in out)
+            self.hits += n_hits
+            self.misses += len(out) - n_hits
+        return out
+
+    def put_many(self, model, texts, embeddings):
+        """Store the embeddings of chunk texts and evict old entries if the cache is too large."""
+        import numpy as np
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float16)
+            rows.append((model, text_hash(text), len(vector), vector.tobytes(), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, dim, vector, used) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            if self._size is None:
+                self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+            else:
+                self._size += sum(len(r[3]) for r in rows)
+            if self._size > self.max_mb * 1024**2:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is below 90% of max_mb."""
+        target = 0.9 * self.max_mb * 1024**2
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        while total > target:
+            rows = self._conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            remove = []
+            for rowid, size in rows:
+                if total <= target:
+                    break
+                remove.append((rowid,))
+                total -= size
+            self._conn.executemany("DELETE FROM embeddings WHERE rowid=?", remove)
+        self._conn.commit()
+        self._size = total
+
+    def counters(self):
+        """
+        Returns:
+            dict: hits and misses of this process, see run_summary
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def run_summary(self, since):
+        """
+        Hits and misses since a counters() snapshot, e.g. of one generate run.
+
+        Returns:
+            str
+        """
+        now = self.counters()
+        hits, misses = now['hits'] - since['hits'], now['misses'] - since['misses']
+        total = hits + misses
+        rate = f" ({100 * hits / total:.0f}% hits)" if total else ""
+        return f"Embedding cache: {hits} chunks reused, {misses} embedded{rate}"
+
+    def stats(self):
+        """
+        Returns:
+            dict: path, number of entries per model, size and limit in MB, hits and misses of this process
+        """
+        with self._lock:
+            models = dict(self._conn.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model").fetchall())
+            size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        return {"path": str(self.path),
+                "entries": sum(models.values()),
+                "models": models,
+                "size_mb": size / 1024**2,
+                "max_mb": self.max_mb,
+                "hits": self.hits,
+                "misses": self.misses}
+
+    def purge(self, model=None):
+        """
+        Remove all entries (of one model if given).
+
+        Returns:
+            int: number of removed entries
+        """
+        with self._lock:
+            if model:
+                n = self._conn.execute("DELETE FROM embeddings WHERE model=?", (model,)).rowcount
+            else:
+                n = self._conn.execute("DELETE FROM embeddings").rowcount
+            self._conn.commit()
+            self._size = None
+        return n
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(collection=None):
+    """
+    Process-wide shared EmbeddingCache, or None if disabled (MU2E_EMBEDDING_CACHE=false)
+    or the database can't be opened.
+
+    Args:
+        collection (optional): if given, None is also returned for collections without
+                               an embedding_model_id (see collections.get_collection)
+    """
+    global _cache
+    if os.getenv('MU2E_EMBEDDING_CACHE', 'true').lower() != 'true':
+        return None
+    if collection is not None and not getattr(collection, 'embedding_model_id', None):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = EmbeddingCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: embedding cache not available: {e}")
+                return None
+        return _cache
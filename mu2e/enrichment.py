@@ -0,0 +1,327 @@
+"""
+Image enrichment queue: AI image descriptions outside of the ingest critical path.
+
+Ingestion stores and embeds the text of a document right away and puts the extracted images
+on a persisted queue (a sqlite database in the data directory, the images are kept in
+<data dir>/enrichment). A worker picks up the queued documents, generates the image
+descriptions with its own concurrency and rate limit, and re-stores the document, re-embedding only the chunks whose text changed (tools.update_document).
+
+Example:
+    ```python
+    from mu2e.enrichment import get_enrichment_queue
+    queue = get_enrichment_queue()
+    print(queue.status())
+    queue.process()  # describe all pending documents
+    ```
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from .utils import get_data_dir
+from .spool import ImageSpool
+import sqlite3  # after utils, which may swap in pysqlite3
+
+
+def defer_image_descriptions():
+    """Check if image descriptions are generated by the enrichment queue (MU2E_ENRICH_ASYNC, default true)."""
+    return os.getenv('MU2E_ENRICH_ASYNC', 'true').lower() == 'true'
+
+
+class RateLimiter:
+    """
+    Limits the number of concurrent calls and the calls per minute.
+
+    Example:
+        ```python
+        limiter = RateLimiter(max_concurrent=4, per_minute=60)
+        with limiter:
+            call_the_api()
+        ```
+    """
+
+    def __init__(self, max_concurrent=None, per_minute=None):
+        """
+        Args:
+            max_concurrent (int, optional): Defaults to MU2E_ENRICH_CONCURRENCY or 4.
+            per_minute (float, optional): 0 for no limit. Defaults to MU2E_ENRICH_RATE or 60.
+        """
+        self.max_concurrent = max_concurrent or int(os.getenv('MU2E_ENRICH_CONCURRENCY', '4'))
+        self.per_minute = per_minute if per_minute is not None else float(os.getenv('MU2E_ENRICH_RATE', '60'))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._next = 0.
+
+    def __enter__(self):
+        self._slots.acquire()
+        if self.per_minute > 0:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next)
+                self._next = start + 60. / self.per_minute
+            time.sleep(max(0., start - now))
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+
+
+class EnrichmentQueue:
+    """
+    Persisted queue of documents waiting for image descriptions.
+
+    Every job holds a stored document (as in meta.json, without the raw files), the images
+    of its files, and the collection it was stored in. A newer job for the same document and
+    collection replaces a pending one.
+
+    Attributes:
+        path (Path): sqlite file. Defaults to MU2E_ENRICH_QUEUE_PATH or <data dir>/enrichment_queue.db.
+        max_attempts (int): failed jobs are retried until this many attempts
+        retry_delay (float): seconds before a failed job is retried, doubled with every attempt.
+                             Defaults to MU2E_ENRICH_RETRY_DELAY or 300.
+        limiter (RateLimiter): limits the image description calls of this process
+    """
+
+    def __init__(self, path=None, max_attempts=3, limiter=None, retry_delay=None):
+        path = path or os.getenv('MU2E_ENRICH_QUEUE_PATH')
+        self.path = Path(path) if path else get_data_dir() / "enrichment_queue.db"
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv('MU2E_ENRICH_RETRY_DELAY', '300'))
+        self.limiter = limiter or RateLimiter()
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                doc_id TEXT NOT NULL,
+                                collection TEXT NOT NULL,
+                                doc TEXT NOT NULL,
+                                images TEXT NOT NULL,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                attempts INTEGER DEFAULT 0,
+                                error TEXT,
+                                created REAL,
+                                updated REAL,
+                                not_before REAL,
+                                UNIQUE (doc_id, collection))""")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "not_before" not in columns:  # queues created before the retry backoff
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+        self._conn.commit()
+
+    def enqueue(self, doc, collection=None):
+        """
+        Queue the images of a stored document. The images are taken from the files
+        ('images', set by docdb.parse_files when descriptions are deferred) and removed there.
+
+        Args:
+            doc (dict): stored document
+            collection: ChromaDB collection the document is stored in (uses default if None)
+
+        Returns:
+            int: number of queued images
+        """
+        files = {}
+        for i, f in enumerate(doc.get('files', [])):
+            file_images = f.pop('images', None)
+            if file_images and f.get('text'):
+                files[str(i)] = file_images
+        if not files:
+            return 0
+        short_name = getattr(collection, 'short_name', None) if collection is not None else "default"
+        if short_name is None:
+            print(f"Warning: can't queue image descriptions for collection {collection.name}")
+            return 0
+        doc_id = f"mu2e-docdb-{doc['docid']}"
+        doc_json = dict(doc)
+        doc_json['files'] = [{k: v for k, v in f.items() if k != "document"} for f in doc['files']]
+        now = time.time()
+
+        # the images are moved from the spool to the data directory, the job only has their location
+        job_dir = get_data_dir() / "enrichment" / f"{doc_id}_{short_name}_{int(now * 1000)}"
+        images = {}
+        for i, file_images in files.items():
+            if not isinstance(file_images, ImageSpool):
+                spool = ImageSpool()
+                spool.extend(file_images)
+                file_images = spool
+            images[i] = file_images.move_to(job_dir / i).path
+        with self._lock:
+            old = self._conn.execute("SELECT images FROM jobs WHERE doc_id=? AND collection=?",
+                                     (doc_id, short_name)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO jobs (doc_id, collection, doc, images, status, attempts, created, updated) "
+                               "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+                               (doc_id, short_name, json.dumps(doc_json), json.dumps(images), now, now))
+            self._conn.commit()
+        if old is not None:
+            self._remove_images(old[0])
+        n = sum(len(v) for v in files.values())
+        print(f"mu2e-docdb-{doc['docid']} - queued {n} images for descriptions")
+        return n
+
+    @staticmethod
+    def _remove_images(images_json):
+        for path in json.loads(images_json).values():
+            shutil.rmtree(Path(path).parent, ignore_errors=True)
+
+    def _claim(self):
+        """Mark the oldest pending job that is not waiting for a retry as running and return it."""
+        with self._lock:
+            row = self._conn.execute("SELECT id, doc_id, collection, doc, images, attempts FROM jobs "
+                                     "WHERE status='pending' AND (not_before IS NULL OR not_before<=?) "
+                                     "ORDER BY updated LIMIT 1", (time.time(),)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE jobs SET status='running', attempts=attempts+1, updated=? WHERE id=?",
+                               (time.time(), row[0]))
+            self._conn.commit()
+        return {"id": row[0], "doc_id": row[1], "collection": row[2],
+                "doc": json.loads(row[3]), "images": json.loads(row[4]), "attempts": row[5] + 1}
+
+    def _finish(self, job, error=None):
+        with self._lock:
+            if error is None:
+                self._conn.execute("DELETE FROM jobs WHERE id=?", (job['id'],))
+                self._remove_images(json.dumps(job['images']))
+            else:
+                # retried after retry_delay, 2*retry_delay, ... (e.g. until the vision model is back)
+                status = 'failed' if job['attempts'] >= self.max_attempts else 'pending'
+                now = time.time()
+                self._conn.execute("UPDATE jobs SET status=?, error=?, updated=?, not_before=? WHERE id=?",
+                                   (status, error, now, now + self.retry_delay * 2 ** (job['attempts'] - 1), job['id']))
+            self._conn.commit()
+
+    def requeue_stale(self, older_than=3600):
+        """Put jobs that are 'running' for longer than older_than seconds (e.g. after a crash) back in the queue."""
+        with self._lock:
+            n = self._conn.execute("UPDATE jobs SET status='pending' WHERE status='running' AND updated<?",
+                                   (time.time() - older_than,)).rowcount
+            self._conn.commit()
+        return n
+
+    def retry_failed(self):
+        """Put failed jobs back in the queue."""
+        with self._lock:
+            n = self._conn.execute("UPDATE jobs SET status='pending', attempts=0, not_before=NULL "
+                                   "WHERE status='failed'").rowcount
+            self._conn.commit()
+        return n
+
+    def status(self):
+        """
+        Returns:
+            dict: number of jobs per status, and how many of the pending jobs wait for a retry ('waiting')
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            waiting = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status='pending' AND not_before>?",
+                                         (time.time(),)).fetchone()[0]
+        out = {"pending": 0, "running": 0, "failed": 0}
+        out.update(dict(rows))
+        out["waiting"] = waiting
+        return out
+
+    def _run(self, job):
+        from .collections import get_collection, collection_names
+        from .manifest import get_manifest, VERSION_FIELDS
+        from .parsers import parser
+        from .tools import update_document
+
+        doc = job['doc']
+        collection = get_collection(job['collection'])
+        entry = get_manifest(collection).get(job['doc_id'])
+        if entry is not None and any(entry.get(f) != doc.get(f) for f in VERSION_FIELDS):
+            print(f"{job['doc_id']} - a newer version is stored, skipping image descriptions")
+            return
+
+        for i, images in job['images'].items():
+            f = doc['files'][int(i)]
+            p = parser(None, f['type'])
+            # a failed description fails the job, it is retried with its images
+            f['text'] = p.add_image_descriptions(f['text'], ImageSpool(images), limiter=self.limiter,
+                                                 raise_on_error=True)
+        n = update_document(doc, collection)
+        print(f"{job['doc_id']} - image descriptions added, {n} chunks re-embedded")
+
+        # other collections that store the same version (e.g. generated from the local meta.json)
+        for name in collection_names:
+            if name == job['collection']:
+                continue
+            other = get_collection(name)
+            if get_manifest(other).is_current(job['doc_id'], doc):
+                update_document(doc, other)
+
+        meta_file = get_data_dir() / job['doc_id'] / "meta.json"
+        if meta_file.exists():
+            from .docdb import docdb
+            docdb(login=False).saveMetaJson(doc)
+
+    def process(self, max_jobs=None):
+        """
+        Process pending jobs one document at a time (the image descriptions of a document run in
+        parallel, limited by the rate limiter). Stops at the first failed job, it and the remaining
+        jobs are tried again by a later call (the failed job only after its retry delay).
+
+        Args:
+            max_jobs (int, optional): stop after this many jobs, default is until the queue is empty
+
+        Returns:
+            int: number of processed jobs
+        """
+        from .utils import should_add_image_descriptions
+        if not should_add_image_descriptions():
+            print("Image descriptions are disabled (MU2E_IMAGE_LLM_URL/MU2E_IMAGE_DESCRIPTION), not processing the queue")
+            return 0
+        self.requeue_stale()
+        done = 0
+        while max_jobs is None or done < max_jobs:
+            job = self._claim()
+            if job is None:
+                break
+            try:
+                self._run(job)
+                self._finish(job)
+            except Exception as e:
+                print(f"{job['doc_id']} - image descriptions failed (attempt {job['attempts']}): {e}")
+                self._finish(job, error=str(e))
+                return done + 1
+            done += 1
+        return done
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_enrichment_queue():
+    """Process-wide shared EnrichmentQueue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = EnrichmentQueue()
+        return _queue
+
+
+def start_enrichment_worker(interval_seconds=60):
+    """
+    Process the enrichment queue in a background thread.
+
+    Args:
+        interval_seconds (int): seconds to sleep when the queue is empty
+    """
+    def background_loop():
+        queue = get_enrichment_queue()
+        while True:
+            try:
+                queue.process()
+            except Exception as e:
+                print(f"Enrichment worker failed: {e}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=background_loop, daemon=True)
+    thread.start()
+    print(f"Started enrichment worker (checking every {interval_seconds} seconds)")
+    return thread
@@ -0,0 +1,200 @@
+"""
+Exact retrieval evaluation with NumPy.
+
+Asking Chroma for thousands of nearest chunks per question to find the rank of the target
+document is slow and only approximate (HNSW). ExactIndex exports the embeddings of a
+collection once into a contiguous matrix, computes the distances of all questions to all
+chunks with one matrix multiplication per batch of questions (in the distance of the
+collection's HNSW space: l2, ip or cosine) and derives the exact rank of every target
+document, MRR and recall@k with vectorized NumPy. hnsw_recall compares the nearest chunks
+returned by Chroma with the exact ones, i.e. how much recall the approximation loses.
+
+Example:
+    ```python
+    from mu2e.collections import get_collection
+    from mu2e.evaluation import ExactIndex
+
+    index = ExactIndex(get_collection("argo"))
+    ranks = index.rank(index.embed(questions), target_doc_ids)
+    print(ExactIndex.metrics(ranks["doc_rank"]))
+    ```
+"""
+
+import numpy as np
+
+DEFAULT_KS = (1, 5, 10, 20, 100)
+
+
+def chunk_doc_id(chunk_id, metadata=None):
+    """Document id of a chunk: metadata 'doc_id', or the chunk id up to the first '_'."""
+    return (metadata or {}).get('doc_id') or chunk_id.split('_')[0]
+
+
+def hnsw_space(collection):
+    """Distance function of a collection's HNSW index ('l2', 'ip' or 'cosine')."""
+    configuration = getattr(collection, 'configuration', None) or {}
+    space = (configuration.get('hnsw') or {}).get('space')
+    return space or (collection.metadata or {}).get('hnsw:space', 'l2')
+
+
+class ExactIndex:
+    """
+    In-memory copy of the embeddings of a collection for exact nearest neighbour evaluation.
+
+    Attributes:
+        collection: ChromaDB collection
+        space (str): 'l2' (squared euclidean), 'ip' (1 - dot product) or 'cosine' (1 - cosine similarity)
+        ids (list): chunk ids, sorted by document so that the chunks of a document are contiguous
+        doc_ids (list): document id of each document block
+        matrix (np.ndarray): (n_chunks, dim) embeddings, float32 or float16
+    """
+
+    def __init__(self, collection, dtype=np.float32, batch_size=5000):
+        """
+        Args:
+            collection: ChromaDB collection
+            dtype: storage type of the matrix, np.float16 halves the memory (distances are computed in float32)
+            batch_size (int): chunks per collection.get call while exporting
+        """
+        self.collection = collection
+        self.space = hnsw_space(collection)
+        n = collection.count()
+        ids, docs, matrix = [], [], None
+        offset = 0
+        while offset < n:
+            batch = collection.get(include=['embeddings', 'metadatas'], limit=batch_size, offset=offset)
+            if not len(batch['ids']):
+                break
+            embeddings = np.asarray(batch['embeddings'], dtype=dtype)
+            if matrix is None:
+                matrix = np.empty((n, embeddings.shape[1]), dtype=dtype)
+            matrix[len(ids):len(ids) + len(embeddings)] = embeddings
+            ids.extend(batch['ids'])
+            docs.extend(chunk_doc_id(i, m) for i, m in zip(batch['ids'], batch['metadatas']))
+            offset += len(batch['ids'])
+        matrix = matrix[:len(ids)] if matrix is not None else np.empty((0, 0), dtype=dtype)
+
+        # group the chunks of every document into one contiguous block
+        self.doc_ids, codes = np.unique(np.asarray(docs, dtype=object), return_inverse=True) if docs \
+            else (np.asarray([], dtype=object), np.asarray([], dtype=int))
+        order = np.argsort(codes, kind='stable')
+        self.ids = [ids[i] for i in order]
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.chunk_docs = codes[order]
+        self.doc_starts = np.searchsorted(self.chunk_docs, np.arange(len(self.doc_ids)))
+        self._doc_index = {d: k for k, d in enumerate(self.doc_ids)}
+        m = self.matrix.astype(np.float32, copy=False)
+        if self.space == 'cosine':
+            self._norms = np.linalg.norm(m, axis=1)
+            self._norms[self._norms == 0] = 1.
+        elif self.space == 'l2':
+            self._sq_norms = np.einsum('ij,ij->i', m, m)
+
+    @property
+    def nbytes(self):
+        """Memory of the embedding matrix in bytes."""
+        return self.matrix.nbytes
+
+    def embed(self, questions, batch_size=None):
+        """Embed questions with the collection's embedding function (see search.embed_queries)."""
+        from .search import embed_queries
+        return np.asarray(embed_queries(list(questions), collection=self.collection, batch_size=batch_size),
+                          dtype=np.float32)
+
+    def distances(self, query_embeddings):
+        """
+        Exact distances of queries to all chunks, as Chroma computes them for self.space.
+
+        Args:
+            query_embeddings: (n_queries, dim) array
+
+        Returns:
+            np.ndarray: (n_queries, n_chunks) float32, lower is closer
+        """
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        dots = q @ self.matrix.astype(np.float32, copy=False).T
+        if self.space == 'ip':
+            return 1. - dots
+        if self.space == 'cosine':
+            q_norms = np.linalg.norm(q, axis=1)
+            q_norms[q_norms == 0] = 1.
+            return 1. - dots / q_norms[:, None] / self._norms[None, :]
+        return np.einsum('ij,ij->i', q, q)[:, None] - 2. * dots + self._sq_norms[None, :]
+
+    def rank(self, query_embeddings, target_doc_ids, max_matrix_mb=512):
+        """
+        Exact rank of the target document of every query.
+
+        Args:
+            query_embeddings: (n_queries, dim) array
+            target_doc_ids (list): document id per query
+            max_matrix_mb (float): size of the distance matrix of one batch of queries
+
+        Returns:
+            dict of arrays (one value per query):
+                doc_rank: 1-based rank of the target document among all documents, ordered by their
+                          closest chunk (np.inf if the document is not in the collection)
+                chunk_rank: 1-based rank of the closest chunk of the target document among all chunks
+                distance: distance of the closest chunk of the target document
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        n_queries, n_chunks = len(query_embeddings), len(self.ids)
+        targets = np.asarray([self._doc_index.get(d, -1) for d in target_doc_ids])
+        doc_rank = np.full(n_queries, np.inf)
+        chunk_rank = np.full(n_queries, np.inf)
+        distance = np.full(n_queries, np.nan)
+        if n_chunks == 0:
+            return {"doc_rank": doc_rank, "chunk_rank": chunk_rank, "distance": distance}
+        step = max(1, int(max_matrix_mb * 1024**2 / 4 / n_chunks))
+        for i in range(0, n_queries, step):
+            dist = self.distances(query_embeddings[i:i + step])
+            # closest chunk of every document, (batch, n_docs)
+            doc_best = np.minimum.reduceat(dist, self.doc_starts, axis=1)
+            found = targets[i:i + step] >= 0
+            rows = np.nonzero(found)[0]
+            target_best = doc_best[rows, targets[i:i + step][found]]
+            doc_rank[i + rows] = 1 + (doc_best[rows] < target_best[:, None]).sum(axis=1)
+            chunk_rank[i + rows] = 1 + (dist[rows] < target_best[:, None]).sum(axis=1)
+            distance[i + rows] = target_best
+        return {"doc_rank": doc_rank, "chunk_rank": chunk_rank, "distance": distance}
+
+    @staticmethod
+    def metrics(ranks, ks=DEFAULT_KS):
+        """
+        MRR and recall@k of ranks (1-based, np.inf if not found).
+
+        Returns:
+            dict: mrr, recall@k for every k, n (number of queries)
+        """
+        ranks = np.asarray(ranks, dtype=float)
+        out = {"n": int(len(ranks)), "mrr": float(np.mean(1. / ranks)) if len(ranks) else 0.}
+        for k in ks:
+            out[f"recall@{k}"] = float(np.mean(ranks <= k)) if len(ranks) else 0.
+        return out
+
+    def top_chunks(self, query_embeddings, k=10):
+        """Ids of the exact k nearest chunks of every query."""
+        dist = self.distances(query_embeddings)
+        k = min(k, dist.shape[1])
+        top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        return [[self.ids[j] for j in row] for row in top]
+
+    def hnsw_recall(self, query_embeddings, k=10, batch_size=64):
+        """
+        Recall of Chroma's approximate (HNSW) search: mean fraction of the exact k nearest
+        chunks that are also returned by collection.query.
+
+        Returns:
+            float: 1.0 if the approximate search finds all exact nearest neighbours
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        k = min(k, len(self.ids))
+        if k == 0 or len(query_embeddings) == 0:
+            return 1.
+        recalls = []
+        for i in range(0, len(query_embeddings), batch_size):
+            batch = query_embeddings[i:i + batch_size]
+            approx = self.collection.query(query_embeddings=batch, n_results=k, include=[])['ids']
+            for exact, found in zip(self.top_chunks(batch, k), approx):
+                recalls.append(len(set(exact) & set(found)) / k)
+        return float(np.mean(recalls))
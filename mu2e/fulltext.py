@@ -0,0 +1,209 @@
+"""
+Ranked full-text index of the stored chunks.
+
+Every collection has a SQLite FTS5 table with the text of its chunks (fulltext.db next to
+the Chroma database), kept in sync by tools.upsert_chunks and tools.delete_chunks.
+search.search_fulltext ranks matches with BM25 instead of scanning all chunks with
+Chroma's `$contains`.
+
+An index that was created for a collection which already had chunks is incomplete until
+it is rebuilt; until then full-text search falls back to `$contains`:
+
+    mu2e-docdb --collection=argo fulltext-index rebuild
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+from .utils import get_chroma_path
+import sqlite3  # after utils, which may swap in pysqlite3
+
+
+def to_match_query(query, match_any=False):
+    """
+    Convert a user query into an FTS5 MATCH expression: all words (or "quoted phrases")
+    have to occur, FTS5 operators and special characters are treated as text.
+
+    Args:
+        query (str): search query
+        match_any (bool): match chunks with any of the words instead (ranked by BM25,
+                          so chunks with more and rarer words come first)
+
+    Returns:
+        str: MATCH expression, empty if the query has no words
+    """
+    terms = re.findall(r'"([^"]+)"|(\w+)', query)
+    quoted = []
+    for phrase, word in terms:
+        text = (phrase or word).strip()
+        if text:
+            quoted.append('"' + text.replace('"', '""') + '"')
+    return (" OR " if match_any else " ").join(quoted)
+
+
+class FullTextIndex:
+    """
+    FTS5 index of the chunks of all collections.
+
+    Attributes:
+        path (Path): sqlite file. Defaults to MU2E_FULLTEXT_PATH or <chroma path>/fulltext.db.
+    """
+
+    def __init__(self, path=None):
+        path = path or os.getenv('MU2E_FULLTEXT_PATH')
+        self.path = Path(path) if path else Path(get_chroma_path()) / "fulltext.db"
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_check USING fts5(x)")  # fails without FTS5
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS indexes (
+                                collection TEXT PRIMARY KEY,
+                                tbl TEXT NOT NULL,
+                                complete INTEGER NOT NULL)""")
+        self._conn.commit()
+        self._tables = dict(self._conn.execute("SELECT collection, tbl FROM indexes").fetchall())
+
+    def _table(self, collection):
+        """FTS table of a collection, created on first use (complete if the collection is empty)."""
+        name = collection.name
+        table = self._tables.get(name)
+        if table is None:
+            table = "fts_" + re.sub(r'\W', '_', name)
+            self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                               f"chunk_id UNINDEXED, doc_id UNINDEXED, text, tokenize='porter unicode61')")
+            # chunk id -> rowid of the FTS table (unindexed FTS columns can only be scanned)
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_ids (id INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL)")
+            # another process may have registered (and completed) the index in the meantime, keep its flag
+            complete = 1 if collection.count() == 0 else 0
+            self._conn.execute("INSERT OR IGNORE INTO indexes (collection, tbl, complete) VALUES (?, ?, ?)",
+                               (name, table, complete))
+            self._conn.commit()
+            table = self._conn.execute("SELECT tbl FROM indexes WHERE collection=?", (name,)).fetchone()[0]
+            self._tables[name] = table
+        return table
+
+    def ensure(self, collection):
+        """Create the index of a collection (call before the first chunks are stored)."""
+        with self._lock:
+            self._table(collection)
+
+    def is_complete(self, collection):
+        """Check if the index has all chunks of a collection."""
+        with self._lock:
+            row = self._conn.execute("SELECT complete FROM indexes WHERE collection=?", (collection.name,)).fetchone()
+        return bool(row and row[0])
+
+    def upsert(self, collection, ids, documents, metadatas=None):
+        """Add or replace chunks."""
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            table = self._table(collection)
+            self._delete(table, ids)
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                rowid = self._conn.execute(f"INSERT INTO {table}_ids (chunk_id) VALUES (?)", (chunk_id,)).lastrowid
+                self._conn.execute(f"INSERT INTO {table} (rowid, chunk_id, doc_id, text) VALUES (?, ?, ?, ?)",
+                                   (rowid, chunk_id, (metadata or {}).get('doc_id', ''), document or ''))
+            self._conn.commit()
+
+    def _delete(self, table, ids):
+        ids = list(ids)
+        for i in range(0, len(ids), 500):  # stay below the sqlite variable limit
+            part = ids[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            self._conn.execute(f"DELETE FROM {table} WHERE rowid IN "
+                               f"(SELECT id FROM {table}_ids WHERE chunk_id IN ({placeholders}))", part)
+            self._conn.execute(f"DELETE FROM {table}_ids WHERE chunk_id IN ({placeholders})", part)
+
+    def delete(self, collection, ids):
+        """Remove chunks."""
+        with self._lock:
+            self._delete(self._table(collection), ids)
+            self._conn.commit()
+
+    def search(self, collection, query, limit=10, offset=0, match_any=False):
+        """
+        Chunks matching a query, best first.
+
+        Args:
+            collection: ChromaDB collection
+            query (str): search query, see to_match_query
+            limit (int): number of results
+            offset (int): number of best results to skip
+            match_any (bool): see to_match_query
+
+        Returns:
+            list: (chunk id, BM25 score) tuples, higher scores are more relevant
+        """
+        match = to_match_query(query, match_any)
+        if not match:
+            return []
+        with self._lock:
+            table = self._table(collection)
+            rows = self._conn.execute(f"SELECT chunk_id, bm25({table}) AS rank FROM {table} "
+                                      f"WHERE {table} MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                                      (match, limit, offset)).fetchall()
+        # FTS5 returns negative BM25 scores (lower is better)
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def rebuild(self, collection, batch_size=1000):
+        """
+        Re-index all chunks of a collection.
+
+        Returns:
+            int: number of indexed chunks
+        """
+        with self._lock:
+            table = self._table(collection)
+            self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute(f"DELETE FROM {table}_ids")
+            self._conn.execute("UPDATE indexes SET complete=0 WHERE collection=?", (collection.name,))
+            self._conn.commit()
+        n = 0
+        offset = 0
+        while True:
+            batch = collection.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+            self.upsert(collection, batch['ids'], batch['documents'], batch['metadatas'])
+            n += len(batch['ids'])
+            offset += batch_size
+        with self._lock:
+            self._conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+            self._conn.execute("UPDATE indexes SET complete=1 WHERE collection=?", (collection.name,))
+            self._conn.commit()
+        return n
+
+    def stats(self):
+        """
+        Returns:
+            dict: path and, per collection, number of indexed chunks and if the index is complete
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT collection, tbl, complete FROM indexes").fetchall()
+            collections = {name: {"chunks": self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+                                  "complete": bool(complete)}
+                           for name, table, complete in rows}
+        return {"path": str(self.path), "collections": collections}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fulltext_index():
+    """
+    Process-wide shared FullTextIndex, or None if disabled (MU2E_FULLTEXT_INDEX=false)
+    or not available (sqlite without FTS5).
+    """
+    global _index
+    if os.getenv('MU2E_FULLTEXT_INDEX', 'true').lower() != 'true':
+        return None
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = FullTextIndex()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: full-text index not available: {e}")
+                return None
+        return _index
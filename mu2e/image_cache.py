@@ -0,0 +1,299 @@
+"""
+Persistent cache of AI image descriptions.
+
+Descriptions are stored in a sqlite database in the data directory (image_descriptions.db),
+keyed by the vision model and a hash of the (already resized) image. By default a
+difference hash (dHash) is used, so logos and slide templates that are re-encoded or
+slightly different still map to the same description. MU2E_IMAGE_CACHE_DISTANCE sets
+the allowed Hamming distance between hashes, MU2E_IMAGE_CACHE_HASH=sha256 switches to exact matches.
+Near (not identical) hashes only count if the images also have the same size, so different
+plots with the same axes or slide template are not mistaken for each other.
+
+Near-duplicate lookups don't scan all stored hashes: every dHash is split into 16-bit bands
+(table dhash_bands, indexed by band value). Two hashes within distance d of each other have at
+least one band that differs in at most d // n_bands bits, so only hashes with such a band are
+compared.
+"""
+
+import base64
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+from pathlib import Path
+from .utils import get_data_dir
+import sqlite3  # after utils, which may swap in pysqlite3
+
+
+def dhash(image_base64, size=16):
+    """
+    Difference hash of a base64 encoded image.
+
+    Args:
+        image_base64 (str): base64 encoded image
+        size (int): hash size, the hash has size*size bits
+
+    Returns:
+        str: hash as hex string
+    """
+    from PIL import Image
+    img = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+    img = img.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def image_hash(image_base64, mode=None):
+    """
+    Cache key of an image.
+
+    Args:
+        image_base64 (str): base64 encoded image
+        mode (str, optional): "dhash" or "sha256". Defaults to MU2E_IMAGE_CACHE_HASH or dhash.
+
+    Returns:
+        str: "<mode>:<hex digest>"
+    """
+    mode = mode or os.getenv('MU2E_IMAGE_CACHE_HASH', 'dhash')
+    if mode == "dhash":
+        try:
+            digest = dhash(image_base64)
+            # (almost) flat images have no gradients and would all share one hash
+            if bin(int(digest, 16)).count("1") > 4:
+                return "dhash:" + digest
+        except Exception:
+            pass  # not decodable by PIL
+    return "sha256:" + hashlib.sha256(image_base64.encode()).hexdigest()
+
+
+def image_size(image_base64):
+    """
+    Size of a base64 encoded image.
+
+    Returns:
+        str: "<width>x<height>", None if the image can't be decoded
+    """
+    from PIL import Image
+    try:
+        width, height = Image.open(io.BytesIO(base64.b64decode(image_base64))).size
+    except Exception:
+        return None
+    return f"{width}x{height}"
+
+
+def default_max_distance():
+    """Max Hamming distance of near-identical dHashes, MU2E_IMAGE_CACHE_DISTANCE or 6 (of 256 bits)."""
+    return int(os.getenv('MU2E_IMAGE_CACHE_DISTANCE', '6'))
+
+
+def is_near(key_a, key_b, max_distance=None, size_a=None, size_b=None):
+    """
+    Check if two image hashes (see image_hash) belong to the same image.
+
+    Args:
+        key_a (str): image hash
+        key_b (str): image hash
+        max_distance (int, optional): max Hamming distance of dHashes. Defaults to default_max_distance().
+        size_a (str, optional): size of image a, see image_size
+        size_b (str, optional): size of image b, near (not identical) hashes need equal, known sizes
+
+    Returns:
+        bool
+    """
+    if key_a == key_b:
+        return True
+    if max_distance is None:
+        max_distance = default_max_distance()
+    if not (key_a.startswith("dhash:") and key_b.startswith("dhash:")) or max_distance <= 0:
+        return False
+    if size_a is None or size_a != size_b:
+        return False
+    return bin(int(key_a[6:], 16) ^ int(key_b[6:], 16)).count("1") <= max_distance
+
+
+BAND_BITS = 16
+
+
+def dhash_bands(key):
+    """16-bit bands of a dHash key (see image_hash), [] for other keys."""
+    if not key.startswith("dhash:"):
+        return []
+    digest = key[6:]
+    step = BAND_BITS // 4
+    return [int(digest[i:i + step], 16) for i in range(0, len(digest), step)]
+
+
+def _band_neighbours(value, radius):
+    """All band values within Hamming distance radius of value."""
+    values = [value]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(BAND_BITS), r):
+            values.append(value ^ sum(1 << b for b in bits))
+    return values
+
+
+class ImageDescriptionCache:
+    """
+    Disk cache for image descriptions.
+
+    Attributes:
+        path (Path): sqlite file. Defaults to MU2E_IMAGE_CACHE_PATH or <data dir>/image_descriptions.db.
+        max_distance (int): max Hamming distance of two dHashes that count as the same image.
+                            Defaults to MU2E_IMAGE_CACHE_DISTANCE or 6 (of 256 bits).
+        hits (int): lookups answered from the cache since creation
+        misses (int): lookups not in the cache since creation
+    """
+
+    def __init__(self, path=None, max_distance=None):
+        path = path or os.getenv('MU2E_IMAGE_CACHE_PATH')
+        self.path = Path(path) if path else get_data_dir() / "image_descriptions.db"
+        self.max_distance = max_distance if max_distance is not None else default_max_distance()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS descriptions (
+                                model TEXT NOT NULL,
+                                hash TEXT NOT NULL,
+                                description TEXT NOT NULL,
+                                created REAL,
+                                used REAL,
+                                uses INTEGER DEFAULT 0,
+                                size TEXT,
+                                PRIMARY KEY (model, hash))""")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(descriptions)")]
+        if "size" not in columns:  # databases written before the image size was stored
+            self._conn.execute("ALTER TABLE descriptions ADD COLUMN size TEXT")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS dhash_bands (
+                                model TEXT NOT NULL,
+                                hash TEXT NOT NULL,
+                                band INTEGER NOT NULL,
+                                value INTEGER NOT NULL,
+                                PRIMARY KEY (model, hash, band))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS dhash_bands_value ON dhash_bands (model, band, value)")
+        # databases written before the bands existed
+        missing = self._conn.execute("""SELECT model, hash FROM descriptions d WHERE hash LIKE 'dhash:%' AND NOT EXISTS
+                                          (SELECT 1 FROM dhash_bands b WHERE b.model=d.model AND b.hash=d.hash)""").fetchall()
+        for model, key in missing:
+            self._put_bands(model, key)
+        self._conn.commit()
+
+    def _put_bands(self, model, key):
+        self._conn.executemany("INSERT OR REPLACE INTO dhash_bands (model, hash, band, value) VALUES (?, ?, ?, ?)",
+                               [(model, key, band, value) for band, value in enumerate(dhash_bands(key))])
+
+    def _find_near(self, model, key, size):
+        """
+        Closest stored dHash within max_distance of an image with the same size,
+        only hashes sharing a (nearly) equal band are compared.
+        """
+        bands = dhash_bands(key)
+        if not bands or size is None or self.max_distance <= 0:
+            return None
+        radius = self.max_distance // len(bands)
+        candidates = {}
+        for band, value in enumerate(bands):
+            values = _band_neighbours(value, radius)
+            rows = self._conn.execute(
+                "SELECT d.hash, d.description FROM dhash_bands b JOIN descriptions d ON d.model=b.model AND d.hash=b.hash "
+                f"WHERE b.model=? AND b.band=? AND b.value IN ({','.join('?' * len(values))}) AND d.size=?",
+                (model, band, *values, size))
+            candidates.update(rows)
+        bits = int(key[6:], 16)
+        best = None
+        for other, description in candidates.items():
+            distance = bin(bits ^ int(other[6:], 16)).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, other, description)
+        return best
+
+    def get(self, model, key, size=None):
+        """
+        Look up a description.
+
+        Args:
+            model (str): vision model
+            key (str): image hash, see image_hash
+            size (str, optional): image size (see image_size), near hashes are only used if it is given and equal
+
+        Returns:
+            str or None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT hash, description FROM descriptions WHERE model=? AND hash=?",
+                                     (model, key)).fetchone()
+            if row is None:
+                near = self._find_near(model, key, size)
+                row = near[1:] if near else None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE descriptions SET used=?, uses=uses+1 WHERE model=? AND hash=?",
+                               (time.time(), model, row[0]))
+            self._conn.commit()
+            self.hits += 1
+            return row[1]
+
+    def put(self, model, key, description, size=None):
+        """Store a description (size: image size, see image_size)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO descriptions (model, hash, description, created, used, uses, size) "
+                               "VALUES (?, ?, ?, ?, ?, 0, ?)", (model, key, description, now, now, size))
+            self._put_bands(model, key)
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: path, number of entries, hits, misses and hit rate of this process,
+                  and the number of reuses recorded in the database
+        """
+        with self._lock:
+            entries, uses = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(uses), 0) FROM descriptions").fetchone()
+        lookups = self.hits + self.misses
+        return {"path": str(self.path),
+                "entries": entries,
+                "total_reuses": uses,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.}
+
+    def purge(self):
+        """Remove all entries, returns the number of removed entries."""
+        with self._lock:
+            n = self._conn.execute("DELETE FROM descriptions").rowcount
+            self._conn.execute("DELETE FROM dhash_bands")
+            self._conn.commit()
+        return n
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    Process-wide shared ImageDescriptionCache, or None if disabled (MU2E_IMAGE_CACHE=false)
+    or the database can't be opened.
+    """
+    global _cache
+    if os.getenv('MU2E_IMAGE_CACHE', 'true').lower() != 'true':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ImageDescriptionCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: image description cache not available: {e}")
+                return None
+        return _cache
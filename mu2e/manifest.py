@@ -0,0 +1,168 @@
+"""
+Sync manifest: records which version of each docdb document is stored in a collection.
+
+The manifest is a json file in the data directory (sync_manifest_<collection>.json) keyed by
+doc_id (mu2e-docdb-XXXXX) with the version, revised_meta and revised_content of the stored
+document. It lets a sync skip unchanged documents with a dictionary lookup and notice revisions.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from .utils import get_data_dir
+
+VERSION_FIELDS = ("version", "revised_meta", "revised_content")
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(collection=None):
+    """
+    Get the (process-wide shared) sync manifest of a collection.
+
+    Args:
+        collection: ChromaDB collection (uses default if None)
+
+    Returns:
+        SyncManifest
+    """
+    if collection is None:
+        from .collections import get_collection
+        collection = get_collection()
+    name = collection.name
+    with _manifests_lock:
+        if name not in _manifests:
+            _manifests[name] = SyncManifest(name, collection=collection)
+        return _manifests[name]
+
+
+class SyncManifest:
+    """
+    Version manifest of the documents stored in one collection.
+
+    Attributes:
+        name (str): collection name
+        path (Path): location of the json file
+        entries (dict): doc_id -> {version, revised_meta, revised_content, synced}
+    """
+
+    def __init__(self, name, collection=None, path=None):
+        """
+        Args:
+            name (str): collection name
+            collection: ChromaDB collection, used to bootstrap entries of documents stored before the manifest existed
+            path (str, optional): json file, defaults to <data dir>/sync_manifest_<name>.json
+        """
+        self.name = name
+        self.collection = collection
+        self.path = Path(path) if path else get_data_dir() / f"sync_manifest_{name}.json"
+        self._lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def doc_id(docid):
+        docid = str(docid)
+        return docid if docid.startswith("mu2e-docdb-") else f"mu2e-docdb-{docid}"
+
+    def get(self, docid):
+        """
+        Manifest entry of a document. Documents that are in the collection but not yet in
+        the manifest are looked up once (a single chunk) and added.
+
+        Args:
+            docid: docdb id or doc_id
+
+        Returns:
+            dict or None
+        """
+        key = self.doc_id(docid)
+        entry = self.entries.get(key)
+        if entry is None and self.collection is not None:
+            res = self.collection.get(where={"doc_id": key}, limit=1, include=['metadatas'])
+            if res['ids']:
+                meta = res['metadatas'][0]
+                entry = {f: meta.get(f) for f in VERSION_FIELDS}
+                entry['synced'] = 0
+                with self._lock:
+                    self.entries[key] = entry
+        return entry
+
+    def is_current(self, docid, meta):
+        """
+        Check if the stored version matches meta (output of docdb.get_meta or a meta.json).
+
+        Args:
+            docid: docdb id or doc_id
+            meta (dict): document meta data with version, revised_meta and revised_content
+
+        Returns:
+            bool
+        """
+        entry = self.get(docid)
+        if entry is None:
+            return False
+        return all(entry.get(f) == meta.get(f) for f in VERSION_FIELDS)
+
+    def listed_unchanged(self, item):
+        """
+        Cheap check based on a list_latest entry only: the document was synced on a later day
+        than its last update (docdb lists only the day of the last update).
+
+        Args:
+            item (dict): list_latest entry with 'id' and 'last_updated'
+
+        Returns:
+            bool
+        """
+        entry = self.entries.get(self.doc_id(item['id']))
+        last_updated = item.get('last_updated')
+        if not entry or not entry.get('synced') or not isinstance(last_updated, datetime):
+            return False
+        return last_updated.date() < datetime.fromtimestamp(entry['synced']).date()
+
+    def update(self, doc, save=True):
+        """
+        Record the version of a stored document.
+
+        Args:
+            doc (dict): stored document (needs docid and the VERSION_FIELDS)
+            save (bool): write the manifest to disk
+        """
+        with self._lock:
+            self.entries[self.doc_id(doc['docid'])] = {**{f: doc.get(f) for f in VERSION_FIELDS},
+                                                       "synced": time.time()}
+        if save:
+            self.save()
+
+    def touch(self, docid, save=True):
+        """Mark a document as checked and unchanged now."""
+        entry = self.get(docid)
+        if entry is None:
+            return
+        with self._lock:
+            entry['synced'] = time.time()
+        if save:
+            self.save()
+
+    def remove(self, docid, save=True):
+        with self._lock:
+            self.entries.pop(self.doc_id(docid), None)
+        if save:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.path.parent, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
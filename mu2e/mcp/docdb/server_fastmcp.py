@@ -9,7 +9,7 @@ import json
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 import mu2e
-from mu2e.collections import get_collection, collection_names
+from mu2e.utils import collection_names
 from mu2e.mcp.docdb.resources import (
     get_metadata_schema,
     get_mu2e_overview,
@@ -37,14 +37,17 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
     dbname = config.get('dbname', DEFAULT_DBNAME)
     collection_name = config.get('collection', 'default')
     
-    # Set up collection based on arguments
+    # Set up collection based on arguments, the embedding model is loaded before the first request
+    import sys
+    from mu2e.collections import get_collection, warmup
+    stats = warmup([collection_name])
+    for c in stats['collections']:
+        print(f"Loaded {c['type']} collection in {c['load_s'] + c.get('warmup_s', 0):.1f}s", file=sys.stderr)
     if collection_name == 'default':
         collection = None
-        import sys
         print(f"Using default collection for {dbname}", file=sys.stderr)
     else:
         collection = get_collection(collection_name)
-        import sys
         print(f"Using {collection_name} collection for {dbname}", file=sys.stderr)
     
     # Initialize database connection
@@ -105,16 +108,22 @@ async def docdb_search(
     query: str = Field(description="The query to search for semantically similar content."),
     n_results: int = Field(description="Maximum number of documents to retrieve.", default=5),
     days: Optional[int] = Field(description="Limit search to documents from last N days.", default=None),
-    filters: Optional[dict] = Field(description="Advanced ChromaDB filters. See file:///schema/metadata resource for available fields and filter examples.", default=None)
+    filters: Optional[dict] = Field(description="Advanced ChromaDB filters. See file:///schema/metadata resource for available fields and filter examples.", default=None),
+    mode: str = Field(description="'vector' for semantic similarity, 'hybrid' to combine it with keyword matching (better for acronyms, run numbers, part numbers).", default="vector"),
+    max_chunks_per_doc: int = Field(description="Maximum number of text chunks per document, n_results distinct documents are returned. 0 returns the best chunks even if several are from the same document.", default=1),
+    rerank: bool = Field(description="Re-order the results with a cross-encoder for better precision (slower).", default=False)
 ) -> str:
-    """Find relevant documents using semantic similarity. Best for conceptual queries."""
+    """Find relevant documents using semantic similarity (optionally combined with keyword matching). Best for conceptual queries."""
     from mu2e.mcp.docdb.tools.search_tool import handle_search_tool
     
     arguments = {
         "query": query,
         "n_results": n_results,
         "days": days,
-        "filters": filters
+        "filters": filters,
+        "mode": mode,
+        "max_chunks_per_doc": max_chunks_per_doc,
+        "rerank": rerank
     }
     # Remove None values
     arguments = {k: v for k, v in arguments.items() if v is not None}
@@ -125,11 +134,11 @@ async def docdb_search(
 
 @mcp.tool()
 async def docdb_fulltext_search(
-    query: str = Field(description="Keywords or phrases to search for in document text."),
+    query: str = Field(description="Keywords to search for in document text, all have to occur. Use \"double quotes\" for exact phrases."),
     n_results: int = Field(description="Maximum number of documents to retrieve.", default=5),
     filters: Optional[dict] = Field(description="Advanced ChromaDB filters. See file:///schema/metadata resource for available fields and filter examples.", default=None)
 ) -> str:
-    """Search for specific keywords or phrases in documents. Best for finding exact terms."""
+    """Search for specific keywords or phrases in documents, ranked by relevance (BM25). Best for finding exact terms."""
     from mu2e.mcp.docdb.tools.fulltext_search_tool import handle_fulltext_search_tool
     
     arguments = {
@@ -15,11 +15,13 @@ async def handle_fulltext_search_tool(arguments: dict, collection) -> list[types
     # Format results for LLM consumption
     response_text = f"<search_results query='{query}' type='fulltext' count='{results['n_results']}'>\n"
     
-    for i, (doc_text, distance, doc_id, metadata) in enumerate(zip(
-        results['documents'], results['distances'], results['ids'], results['metadata']
+    scores = results.get('scores', [None] * results['n_results'])
+    for i, (doc_text, score, doc_id, metadata) in enumerate(zip(
+        results['documents'], scores, results['ids'], results['metadata']
     )):
+        score_attr = f"score='{score:.2f}' " if score is not None else ""
         response_text += (
-            f"<document rank='{i+1}' "
+            f"<document rank='{i+1}' {score_attr}"
             f"docid='{metadata.get('docid', 'N/A')}' "
             f"title='{metadata.get('title', 'N/A')}' "
             f"date='{metadata.get('created', 'N/A')}' "
@@ -1,6 +1,7 @@
 """Search tool handler for MCP server."""
 
 import mcp.types as types
+from datetime import datetime, timedelta
 from mu2e import search
 
 
@@ -10,19 +11,41 @@ async def handle_search_tool(arguments: dict, collection) -> list[types.TextCont
     n_results = arguments.get("n_results", 5)
     days = arguments.get("days")
     filters = arguments.get("filters")
+    mode = arguments.get("mode", "vector")
+    max_chunks_per_doc = arguments.get("max_chunks_per_doc", 1)
+    rerank = arguments.get("rerank", False)
+    
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown search mode '{mode}', use 'vector' or 'hybrid'")
+    date_range = {'start': datetime.now() - timedelta(days=days)} if days else None
     
     # Perform search based on parameters
-    if days:
-        results = search.search_by_date(query, days_back=days, n_results=n_results, filters=filters, collection=collection)
+    if max_chunks_per_doc and max_chunks_per_doc > 0:
+        # n_results distinct documents, chunks of the same document are next to each other
+        results = search.search_documents(query, n_results=n_results, collection=collection, mode=mode,
+                                          max_chunks_per_doc=max_chunks_per_doc, rerank=rerank,
+                                          filters=filters, date_range=date_range)
+    elif rerank:
+        results = search.search_reranked(query, n_results=n_results, collection=collection, mode=mode,
+                                         filters=filters, date_range=date_range)
+    elif mode == "hybrid":
+        results = search.search_hybrid(query, n_results=n_results, filters=filters, date_range=date_range,
+                                       collection=collection)
     else:
-        results = search.search(query, n_results=n_results, filters=filters, collection=collection)
+        results = search.search(query, n_results=n_results, filters=filters, date_range=date_range,
+                                collection=collection)
+    
+    # Format results for LLM consumption, one <document> per run of chunks of the same document
+    groups = []
+    for doc_text, distance, metadata in zip(results['documents'], results['distances'], results['metadata']):
+        if groups and groups[-1][0].get('doc_id') == metadata.get('doc_id'):
+            groups[-1][2].append(doc_text)
+        else:
+            groups.append((metadata, distance, [doc_text]))
     
-    # Format results for LLM consumption
-    response_text = f"<search_results query='{query}' type='vector' count='{results['n_results']}'>\n"
+    response_text = f"<search_results query='{query}' type='{mode}' count='{len(groups)}'>\n"
     
-    for i, (doc_text, distance, doc_id, metadata) in enumerate(zip(
-        results['documents'], results['distances'], results['ids'], results['metadata']
-    )):
+    for i, (metadata, distance, chunks) in enumerate(groups):
         response_text += (
             f"<document rank='{i+1}' "
             f"distance='{distance:.3f}' "
@@ -30,9 +53,9 @@ async def handle_search_tool(arguments: dict, collection) -> list[types.TextCont
             f"title='{metadata.get('title', 'N/A')}' "
             f"date='{metadata.get('created', 'N/A')}' "
             f"link='{metadata.get('link', 'N/A')}'>\n"
-            f"<chunk>{doc_text}</chunk>\n"
+            + "".join(f"<chunk>{doc_text}</chunk>\n" for doc_text in chunks) +
             f"</document>\n"
         )
     
     response_text += "</search_results>"
-    return [types.TextContent(type="text", text=response_text)]
\ No newline at end of file
+    return [types.TextContent(type="text", text=response_text)]
@@ -0,0 +1,205 @@
+"""
+Content-addressed cache of parser output.
+
+The output of get_text() (text and base64 images) is stored in <data dir>/parse_cache
+(a json header line with the text, followed by one line per image), keyed by the SHA-256
+of the file bytes, the document type, the parser class and its version, and the image size.
+Identical files (e.g. the same slides re-uploaded with a new docdb version, or a
+--force-reload) are then not parsed again.
+The cache is bounded in size, the least recently used entries are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from .utils import get_data_dir
+from .spool import image_list
+
+
+def _sha256(document):
+    """SHA-256 of bytes or a document (spooled files are hashed in chunks from disk)."""
+    if isinstance(document, (bytes, bytearray)):
+        return hashlib.sha256(document)
+    if hasattr(document, 'path'):
+        h = hashlib.sha256()
+        with open(document.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024**2), b""):
+                h.update(chunk)
+        return h
+    return hashlib.sha256(document.getvalue())
+
+
+class ParseCache:
+    """
+    Disk cache for parser output.
+
+    Attributes:
+        path (Path): cache directory. Defaults to MU2E_PARSE_CACHE_DIR or <data dir>/parse_cache.
+        max_mb (float): size limit in MB. Defaults to MU2E_PARSE_CACHE_MB or 2048.
+        hits (int): cache hits since creation
+        misses (int): cache misses since creation
+    """
+
+    def __init__(self, path=None, max_mb=None):
+        path = path or os.getenv('MU2E_PARSE_CACHE_DIR')
+        self.path = Path(path) if path else get_data_dir() / "parse_cache"
+        self.max_mb = max_mb or float(os.getenv('MU2E_PARSE_CACHE_MB', '2048'))
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes on disk, computed on first put
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(document, doc_type, rescale_image_max_dim=500):
+        """
+        Cache key of a file.
+
+        Args:
+            document: file content (bytes, io.BytesIO or spool.SpooledDocument)
+            doc_type (str): document type, see parsers.PARSER_MAP
+            rescale_image_max_dim (int): max dimension of extracted images
+
+        Returns:
+            str: hex digest
+        """
+        from .parsers import PARSER_MAP, get_parser_class
+        parser_cls = get_parser_class(doc_type) if doc_type in PARSER_MAP else None
+        parser_id = f"{parser_cls.__name__}:{parser_cls.version}" if parser_cls else "none"
+        h = _sha256(document)
+        h.update(f"|{doc_type}|{parser_id}|{rescale_image_max_dim}".encode())
+        return h.hexdigest()
+
+    def _file(self, key):
+        return self.path / key[:2] / f"{key}.jsonl"
+
+    def get(self, document, doc_type, rescale_image_max_dim=500, key=None):
+        """
+        Look up the parser output of a file.
+
+        Args:
+            key (str, optional): cache key if already computed (see key), the document is then not hashed again
+
+        Returns:
+            tuple or None: (text, images) on a hit, the images are read one by one into an image spool
+        """
+        f = self._file(key or self.key(document, doc_type, rescale_image_max_dim))
+        try:
+            with open(f, 'r') as fp:
+                header = json.loads(fp.readline())
+                images = image_list()
+                for line in fp:
+                    images.append(line.rstrip("\n"))
+            if len(images) != header['n_images']:
+                raise ValueError("incomplete entry")
+            os.utime(f)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return header['text'], images
+
+    def put(self, document, doc_type, text, images, rescale_image_max_dim=500, key=None):
+        """
+        Store the parser output of a file and evict old entries if the cache is too large.
+
+        Args:
+            key (str, optional): cache key if already computed (see key), the document is then not hashed again
+        """
+        f = self._file(key or self.key(document, doc_type, rescale_image_max_dim))
+        os.makedirs(f.parent, exist_ok=True)
+        tmp_path = f.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as fp:
+            fp.write(json.dumps({"doc_type": doc_type, "created": time.time(),
+                                 "text": text, "n_images": len(images)}) + "\n")
+            for image in images:  # one at a time, images may be spooled
+                fp.write(image + "\n")
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, f)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_mb * 1024**2:
+                self._evict()
+
+    def _entries(self):
+        if not self.path.exists():
+            return []
+        return list(self.path.glob("*/*.jsonl"))
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is below 90% of max_mb."""
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                continue
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        target = 0.9 * self.max_mb * 1024**2
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        """
+        Returns:
+            dict: path, number of entries, size and limit in MB, hits and misses of this process
+        """
+        sizes = [p.stat().st_size for p in self._entries()]
+        return {"path": str(self.path),
+                "entries": len(sizes),
+                "size_mb": sum(sizes) / 1024**2,
+                "max_mb": self.max_mb,
+                "hits": self.hits,
+                "misses": self.misses}
+
+    def purge(self):
+        """
+        Remove all entries.
+
+        Returns:
+            int: number of removed entries
+        """
+        removed = 0
+        with self._lock:
+            for p in self._entries():
+                try:
+                    p.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+            self._size = 0
+        return removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """Process-wide shared ParseCache configured from the environment."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+        return _cache
+
+
+def use_parse_cache():
+    """Check if the parse cache is enabled (MU2E_PARSE_CACHE, default true)."""
+    return os.getenv('MU2E_PARSE_CACHE', 'true').lower() == 'true'
@@ -1,33 +1,71 @@
 """
 Modular document parsers for mu2e DocDB
+
+The parser modules (and their dependencies: pdfplumber, python-pptx, python-docx, pandas, PIL)
+are only imported when a document of that type is parsed.
 """
 
-from .base_parser import BaseParser
-from .pdf_parser import PDFParser
-from .pptx_parser import PPTXParser
-from .docx_parser import DOCXParser
-from .excel_parser import ExcelParser
-from .text_parser import TextParser
+import importlib
+from collections.abc import Mapping
+
+# Parser modules and classes, "module:class" relative to this package
+_PARSER_PATHS = {
+    'pdf': 'pdf_parser:PDFParser',
+    'pptx': 'pptx_parser:PPTXParser',
+    'vnd.openxmlformats-officedocument.presentationml.presentation': 'pptx_parser:PPTXParser',
+    'docx': 'docx_parser:DOCXParser',
+    'vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx_parser:DOCXParser',
+    'xlsx': 'excel_parser:ExcelParser',
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'excel_parser:ExcelParser',
+    'txt': 'text_parser:TextParser',
+    'text/plain': 'text_parser:TextParser',
+    #'plain; charset=UTF-8': 'text_parser:TextParser', # some step files!
+}
+
+def get_parser_class(doc_type):
+    """Parser class for a document type (imports the parser module on first use)"""
+    if doc_type not in _PARSER_PATHS:
+        raise NotImplementedError(f"Document type {doc_type} not supported yet. Available: {', '.join(_PARSER_PATHS.keys())}")
+    module, _, cls = _PARSER_PATHS[doc_type].partition(':')
+    return getattr(importlib.import_module(f"{__name__}.{module}"), cls)
+
+class _ParserMap(Mapping):
+    """Document type -> parser class, the parser module is imported when its class is looked up"""
+
+    def __getitem__(self, doc_type):
+        if doc_type not in _PARSER_PATHS:
+            raise KeyError(doc_type)
+        return get_parser_class(doc_type)
+
+    def __contains__(self, doc_type):
+        return doc_type in _PARSER_PATHS
+
+    def __iter__(self):
+        return iter(_PARSER_PATHS)
+
+    def __len__(self):
+        return len(_PARSER_PATHS)
 
 # Parser mapping
-PARSER_MAP = {
-    'pdf': PDFParser,
-    'pptx': PPTXParser,
-    'vnd.openxmlformats-officedocument.presentationml.presentation': PPTXParser,
-    'docx': DOCXParser,
-    'vnd.openxmlformats-officedocument.wordprocessingml.document': DOCXParser,
-    'xlsx': ExcelParser,
-    'vnd.openxmlformats-officedocument.spreadsheetml.sheet': ExcelParser,
-    'txt': TextParser,
-    'text/plain': TextParser,
-    #'plain; charset=UTF-8': TextParser, # some step files!
+PARSER_MAP = _ParserMap()
+
+def parser(document, doc_type, label=None):
+    """Create appropriate parser for document type (label: name of the document in log messages)"""
+    return get_parser_class(doc_type)(document, doc_type, label)
+
+_LAZY = {
+    'BaseParser': 'base_parser',
+    'PDFParser': 'pdf_parser',
+    'PPTXParser': 'pptx_parser',
+    'DOCXParser': 'docx_parser',
+    'ExcelParser': 'excel_parser',
+    'TextParser': 'text_parser',
+    'ParsePool': 'pool',
 }
 
-def parser(document, doc_type):
-    """Create appropriate parser for document type"""
-    if doc_type not in PARSER_MAP:
-        raise NotImplementedError(f"Document type {doc_type} not supported yet. Available: {', '.join(PARSER_MAP.keys())}")
-    
-    return PARSER_MAP[doc_type](document, doc_type)
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(f"{__name__}.{_LAZY[name]}"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = ['parser', 'BaseParser']
\ No newline at end of file
+__all__ = ['parser', 'get_parser_class', 'BaseParser', 'ParsePool']
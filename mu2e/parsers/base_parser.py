@@ -10,10 +10,18 @@ from PIL import Image
 
 class BaseParser(ABC):
     """Base class for all document parsers"""
+
+    # bump when the output of get_text changes, invalidates the parse cache
+    version = 1
     
-    def __init__(self, document, doc_type):
+    def __init__(self, document, doc_type, label=None):
         self.doc = document
         self.doc_type = doc_type
+        self.label = label  # name of the document in log messages, e.g. docid and file name
+
+    def _source(self):
+        """The document as path if it is spooled to disk (see spool.SpooledDocument), otherwise the file object"""
+        return getattr(self.doc, 'path', self.doc)
     
     def _clean_text(self, text):
         """Clean extracted text - remove latex formulas etc."""
@@ -96,14 +104,20 @@ class BaseParser(ABC):
         img.save(buffered, format=save_format)
         return base64.b64encode(buffered.getvalue()).decode()
     
-    def add_image_descriptions(self, text, images, max_workers=None):
+    def add_image_descriptions(self, text, images, max_workers=None, limiter=None, raise_on_error=False):
         """
         Add image descriptions to text by replacing [Image X] with [Image X: DESCRIPTION]
+        Descriptions are reused from the image description cache (see image_cache) and
+        duplicate images are only described once.
         
         Args:
             text (str): Text with [Image X] placeholders
             images (list): List of base64 encoded images
             max_workers (int): Number of parallel workers for API calls (None = use env var)
+            limiter (optional): context manager entered around every API call, e.g. enrichment.RateLimiter
+            raise_on_error (bool): raise if the vision model can't be used or a description fails,
+                                   instead of inserting "Image description unavailable" (for queued
+                                   work that is retried later; the successful descriptions are cached)
             
         Returns:
             str: Text with image descriptions added
@@ -128,34 +142,74 @@ class BaseParser(ABC):
         if not image_matches or not images:
             return text
             
-        print(f"Generating descriptions for {len(image_matches)} images...")
+        # Identical (or near-identical) images are described once, and only if they are not cached
+        from ..image_cache import get_image_cache, image_hash, image_size, is_near
+        model = os.getenv('MU2E_IMAGE_LLM_MODEL', 'gpt-4o-mini')
+        cache = get_image_cache()
+        n_images = min(len(images), len(image_matches))
+        keys = [image_hash(images[i]) for i in range(n_images)]
+        sizes = [image_size(images[i]) for i in range(n_images)]
+        max_distance = cache.max_distance if cache is not None else None
+        for i, key in enumerate(keys):
+            # map near-identical images (same size) of this document to the first one
+            keys[i] = next((k for k, s in zip(keys[:i], sizes) if is_near(k, key, max_distance, s, sizes[i])), key)
+        known = {}  # hash -> description
+        todo = {}   # hash -> index of the first image with this hash
+        for i, key in enumerate(keys):
+            if key in known or key in todo:
+                continue
+            cached = cache.get(model, key, sizes[i]) if cache is not None else None
+            if cached is not None:
+                known[key] = cached
+            else:
+                todo[key] = i
+        n_cached = sum(1 for key in keys if key in known)
+        print(f"Generating descriptions for {len(todo)} images "
+              f"({n_cached} cached, {n_images - n_cached - len(todo)} duplicates)...")
         
-        # Get client once for all requests
-        try:
-            client = getOpenAIClientForImages()
-        except ValueError as e:
-            print(f"Warning: {e}, skipping image descriptions")
-            return text
+        if todo:
+            # Get client once for all requests
+            try:
+                client = getOpenAIClientForImages()
+            except ValueError as e:
+                if raise_on_error:
+                    raise
+                print(f"Warning: {e}, skipping image descriptions")
+                todo = {}
         
         # Get descriptions in parallel
-        descriptions = [None] * len(image_matches)
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_index = {
-                executor.submit(self._get_single_image_description, client, text, images[i], i+1): i 
-                for i in range(min(len(images), len(image_matches)))
-            }
-            
-            # Collect results
-            for future in as_completed(future_to_index):
-                index = future_to_index[future]
-                try:
-                    descriptions[index] = future.result()
-                    print(f"✓ Image {index+1} description generated")
-                except Exception as e:
-                    print(f"✗ Error getting description for image {index+1}: {e}")
-                    descriptions[index] = "Image description unavailable"
+        errors = []
+        if todo:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Submit all tasks
+                def _describe(i):
+                    if limiter is None:
+                        return self._get_single_image_description(client, text, images[i], i+1)
+                    with limiter:
+                        return self._get_single_image_description(client, text, images[i], i+1)
+                
+                future_to_key = {executor.submit(_describe, i): key for key, i in todo.items()}
+                
+                # Collect results
+                for future in as_completed(future_to_key):
+                    key = future_to_key[future]
+                    index = todo[key]
+                    try:
+                        known[key] = future.result()
+                        print(f"✓ Image {index+1} description generated")
+                        if cache is not None:
+                            cache.put(model, key, known[key], sizes[index])
+                    except Exception as e:
+                        print(f"✗ Error getting description for image {index+1}: {e}")
+                        errors.append(e)
+                        known[key] = "Image description unavailable"
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Image description cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries")
+        if errors and raise_on_error:
+            raise RuntimeError(f"{len(errors)} of {len(todo)} image descriptions failed: {errors[0]}")
+        descriptions = [known.get(key) for key in keys]
         
         # Replace [Image X] with [Image X: DESCRIPTION]
         result_text = text
@@ -5,6 +5,7 @@ DOCX (Word document) parser
 import io
 from PIL import Image
 from .base_parser import BaseParser
+from ..spool import image_list
 import os
 
 
@@ -17,9 +18,9 @@ class DOCXParser(BaseParser):
             os.environ['XML_PARSE_HUGE'] = '1'
             import docx
 
-            doc = docx.Document(self.doc)
+            doc = docx.Document(self._source())
             text_parts = []
-            images = []
+            images = image_list()
             image_cnt = 0
             
             # Extract text from paragraphs
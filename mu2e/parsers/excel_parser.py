@@ -13,7 +13,7 @@ class ExcelParser(BaseParser):
             import pandas as pd
             
             # Read all sheets
-            excel_data = pd.read_excel(self.doc, sheet_name=None, header=None)
+            excel_data = pd.read_excel(self._source(), sheet_name=None, header=None)
             text_parts = []
             
             for sheet_name, df in excel_data.items():
@@ -0,0 +1,164 @@
+"""
+Process pool for document parsing with per-file wall-clock timeouts and memory caps.
+
+Every file is parsed in its own worker process (started from a fork server with the
+parsers preloaded), so a slow or pathological file can be killed without affecting
+the calling process. At most max_workers files are parsed at the same time.
+"""
+
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from ..utils import rss_mb
+
+
+class ParseError(RuntimeError):
+    """Raised if a file could not be parsed in the worker process."""
+
+
+class ParseTimeout(ParseError):
+    """Raised if parsing a file took longer than the timeout."""
+
+
+class ParseMemoryError(ParseError):
+    """Raised if the worker process exceeded the memory limit."""
+
+
+def _parse_in_child(conn, document, doc_type, rescale_image_max_dim, label):
+    try:
+        from . import parser
+        text, images = parser(document, doc_type, label).get_text(rescale_image_max_dim=rescale_image_max_dim)
+        conn.send(("ok", text, images))  # spooled images are handed over by path
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}", None))
+    finally:
+        conn.close()
+
+
+def _get_context():
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        from . import _PARSER_PATHS
+        ctx = multiprocessing.get_context("forkserver")
+        # the parser modules and their libraries are imported lazily, preload them in the fork server
+        modules = sorted({f"mu2e.parsers.{m.partition(':')[0]}" for m in _PARSER_PATHS.values()})
+        ctx.set_forkserver_preload(["mu2e.parsers"] + modules + ["pdfplumber", "pptx"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class ParsePool:
+    """
+    Parse documents in separate processes.
+
+    Attributes:
+        max_workers (int): number of files parsed in parallel. Defaults to MU2E_PARSE_WORKERS or the number of cores.
+        timeout (float): wall-clock limit per file in seconds. Defaults to MU2E_PARSE_TIMEOUT or 600.
+        max_rss_mb (float): resident memory limit per file in MB. Defaults to MU2E_PARSE_MAX_RSS_MB or 4096.
+
+    Example:
+        ```python
+        from mu2e.parsers.pool import ParsePool
+        pool = ParsePool(timeout=120)
+        text, images = pool.parse(open("talk.pdf", "rb"), "pdf")
+        ```
+    """
+
+    def __init__(self, max_workers=None, timeout=None, max_rss_mb=None):
+        self.max_workers = max_workers or int(os.getenv('MU2E_PARSE_WORKERS', '0')) or os.cpu_count() or 1
+        self.timeout = timeout or float(os.getenv('MU2E_PARSE_TIMEOUT', '600'))
+        self.max_rss_mb = max_rss_mb or float(os.getenv('MU2E_PARSE_MAX_RSS_MB', '4096'))
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._ctx = _get_context()
+
+    def parse(self, document, doc_type, rescale_image_max_dim=500, label=None):
+        """
+        Parse one document in a worker process, see BaseParser.get_text.
+
+        Args:
+            document: file-like object with the document content
+            doc_type (str): document type, see parsers.PARSER_MAP
+            rescale_image_max_dim (int): max dimension of extracted images
+            label (str, optional): name of the document in log messages of the worker
+
+        Returns:
+            tuple: (text, images)
+
+        Raises:
+            ParseTimeout: if the timeout is exceeded
+            ParseMemoryError: if the memory limit is exceeded
+            ParseError: if the parser failed or the worker died
+        """
+        with self._slots:
+            recv_conn, send_conn = self._ctx.Pipe(duplex=False)
+            p = self._ctx.Process(target=_parse_in_child,
+                                  args=(send_conn, document, doc_type, rescale_image_max_dim, label))
+            p.start()
+            send_conn.close()
+            deadline = time.monotonic() + self.timeout
+            try:
+                while True:
+                    if recv_conn.poll(0.2):
+                        try:
+                            status, text, images = recv_conn.recv()
+                        except EOFError:
+                            raise ParseError(f"parser process exited with code {p.exitcode}")
+                        break
+                    if not p.is_alive() and not recv_conn.poll():
+                        raise ParseError(f"parser process exited with code {p.exitcode}")
+                    if time.monotonic() > deadline:
+                        raise ParseTimeout(f"parsing took longer than {self.timeout:.0f}s")
+                    rss = rss_mb(p.pid)
+                    if rss is not None and rss > self.max_rss_mb:
+                        raise ParseMemoryError(f"parser used {rss:.0f} MB, more than {self.max_rss_mb:.0f} MB")
+            finally:
+                if p.is_alive():
+                    p.kill()
+                p.join()
+                recv_conn.close()
+        if status != "ok":
+            raise ParseError(text)
+        return text, images
+
+    def map(self, files, rescale_image_max_dim=500):
+        """
+        Parse several files in parallel.
+
+        Args:
+            files (list): list of (document, doc_type) or (document, doc_type, label)
+            rescale_image_max_dim (int): max dimension of extracted images
+
+        Returns:
+            list: (text, images) or the raised exception for every file, in input order
+        """
+        def _parse(f):
+            try:
+                return self.parse(f[0], f[1], rescale_image_max_dim=rescale_image_max_dim,
+                                  label=f[2] if len(f) > 2 else None)
+            except Exception as e:
+                return e
+
+        if not files:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(files))) as executor:
+            return list(executor.map(_parse, files))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """Process-wide shared ParsePool configured from the environment."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ParsePool()
+        return _pool
+
+
+def use_parse_pool():
+    """Check if parsing should use the process pool by default (MU2E_PARSE_POOL)."""
+    return os.getenv('MU2E_PARSE_POOL', 'false').lower() == 'true'
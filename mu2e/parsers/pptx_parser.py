@@ -4,20 +4,21 @@ PPTX (PowerPoint) parser
 
 import io
 from PIL import Image
-from pptx import Presentation
 from tqdm import tqdm
 from .base_parser import BaseParser
+from ..spool import image_list
 
 class PPTXParser(BaseParser):
     """Parser for PPTX files"""
     
     def get_text(self, rescale_image_max_dim=500):
         """Extract text and images from PPTX document"""
+        from pptx import Presentation
         extracted_text = ""
-        images = []
+        images = image_list()
         image_cnt = 0
         
-        prs = Presentation(self.doc)
+        prs = Presentation(self._source())
         
         for slide_num, slide in enumerate(tqdm(prs.slides, desc="Processing slides")):
             slide_text = ""
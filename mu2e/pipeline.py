@@ -0,0 +1,275 @@
+"""
+Staged, concurrent ingestion pipeline for docdb documents.
+
+Every document passes through the stages fetch -> parse -> chunk -> embed -> upsert.
+Each stage has its own pool of worker threads and the stages are connected by
+bounded queues, so a slow stage applies backpressure to the stages in front of it
+and the overall throughput is limited by the slowest stage instead of the sum of all.
+
+Example:
+    ```python
+    from mu2e.docdb import docdb
+    from mu2e.pipeline import Pipeline
+
+    db = docdb()
+    docids = [d['id'] for d in db.list_latest(days=30)]
+    Pipeline(db, workers={"fetch": 8, "parse": 4}).run(docids)
+    ```
+"""
+
+import os
+import queue
+import threading
+import time
+
+STAGES = ("fetch", "parse", "chunk", "embed", "upsert")
+
+DEFAULT_WORKERS = {
+    "fetch": 4,
+    "parse": os.cpu_count() or 2,
+    "chunk": 1,
+    "embed": 1,
+    "upsert": 1,
+}
+
+_STOP = object()
+
+
+def parse_worker_spec(spec):
+    """
+    Parse a worker specification like "fetch=8,parse=4" into a dictionary.
+
+    Args:
+        spec (str or list): comma separated stage=count pairs, or a list of them
+
+    Returns:
+        dict: stage -> number of workers
+
+    Raises:
+        ValueError: for unknown stages or invalid counts
+    """
+    if not spec:
+        return {}
+    if isinstance(spec, str):
+        spec = [spec]
+    workers = {}
+    for part in ",".join(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        stage, _, count = part.partition("=")
+        stage = stage.strip()
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage '{stage}'. Available: {', '.join(STAGES)}")
+        try:
+            workers[stage] = int(count)
+        except ValueError:
+            raise ValueError(f"Invalid worker count '{count}' for stage '{stage}'")
+        if workers[stage] < 1:
+            raise ValueError(f"Stage '{stage}' needs at least one worker")
+    return workers
+
+
+def get_pipeline_workers(workers=None):
+    """
+    Worker counts per stage: defaults, overwritten by MU2E_PIPELINE_WORKERS, overwritten by workers.
+
+    Args:
+        workers (dict or str, optional): stage -> number of workers
+
+    Returns:
+        dict: number of workers for every stage
+    """
+    out = DEFAULT_WORKERS.copy()
+    out.update(parse_worker_spec(os.getenv('MU2E_PIPELINE_WORKERS')))
+    if isinstance(workers, (str, list)):
+        workers = parse_worker_spec(workers)
+    out.update(workers or {})
+    return out
+
+
+class Pipeline:
+    """
+    Concurrent fetch/parse/chunk/embed/upsert pipeline on top of a docdb client.
+
+    Attributes:
+        db: docdb client used for fetching (its collection is used for storing)
+        workers (dict): number of worker threads per stage
+        queue_size (int): capacity of the queue in front of each stage
+        stats (dict): per stage counters and busy time, filled by run()
+    """
+
+    def __init__(self, db, workers=None, queue_size=None, force_reload=False,
+                 save_raw=True, add_image_descriptions=False, chunking_strategy="default", pool=None,
+                 collections=None):
+        """
+        Args:
+            db: docdb client
+            workers (dict or str, optional): stage -> worker count, see get_pipeline_workers
+            queue_size (int, optional): bounded queue size between stages. Defaults to MU2E_PIPELINE_QUEUE_SIZE or 8.
+            force_reload (bool): re-ingest documents that are already in the collection
+            save_raw (bool): store meta.json and the raw files in the data directory
+            add_image_descriptions (bool): generate AI image descriptions while parsing
+            chunking_strategy (str): see chunking.chunk_text_simple
+            pool (ParsePool, optional): process pool for parsing. Defaults to one with a process per parse worker.
+            collections (list, optional): store every document in all of these collections (chunked once per
+                                          chunk size, embedded in parallel). Defaults to the collection of db.
+        """
+        self.db = db
+        self.workers = get_pipeline_workers(workers)
+        self.queue_size = queue_size or int(os.getenv('MU2E_PIPELINE_QUEUE_SIZE', '8'))
+        self.force_reload = force_reload
+        self.save_raw = save_raw
+        self.add_image_descriptions = add_image_descriptions
+        self.chunking_strategy = chunking_strategy
+        if pool is None:
+            from mu2e.parsers.pool import ParsePool
+            pool = ParsePool(max_workers=self.workers['parse'])
+        self.pool = pool
+        self.collections = collections
+        self.manifests = None
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    # --- stages ---------------------------------------------------------
+
+    def _fetch(self, item):
+        docid = item['id']
+        meta = None
+        if not self.force_reload:
+            meta = self.db.sync_check(item, self.manifests)
+            if meta is None:
+                return None
+        item['collections'] = self.db.stale_collections(docid, meta, self.collections, self.manifests)
+        print("mu2e-docdb-"+str(docid)+" - get, parse, store...")
+        doc = self.db.get(docid, meta=meta)
+        if doc is None:
+            return None
+        item['doc'] = doc
+        return item
+
+    def _parse(self, item):
+        self.db.parse_files(item['doc'], add_image_descriptions=self.add_image_descriptions, pool=self.pool)
+        return item
+
+    def _chunk(self, item):
+        from mu2e import tools
+        item['chunks'] = tools.chunk_for_collections(item['doc'], item['collections'],
+                                                     chunking_strategy=self.chunking_strategy)
+        return item
+
+    def _embed(self, item):
+        from mu2e import tools
+        item['embeddings'] = tools.embed_for_collections(item['collections'], item['chunks'])
+        return item
+
+    def _upsert(self, item):
+        from mu2e import tools
+        from mu2e.enrichment import get_enrichment_queue
+        from mu2e.manifest import get_manifest
+        doc = item['doc']
+        for collection, (documents, metadatas, ids), embeddings in zip(item['collections'], item['chunks'],
+                                                                        item['embeddings']):
+            tools.upsert_chunks(collection, f"mu2e-docdb-{doc['docid']}",
+                                documents, metadatas, ids, embeddings=embeddings)
+            get_manifest(collection).update(doc)
+        get_enrichment_queue().enqueue(doc, item['collections'][0])
+        if self.save_raw:
+            self.db.saveMetaJson(doc)
+            self.db.saveFiles(doc)
+        with self._lock:
+            self.stats['stored'] += 1
+        return None
+
+    # --- machinery ------------------------------------------------------
+
+    def _worker(self, stage, func, in_q, out_q, remaining):
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            start = time.time()
+            try:
+                result = func(item)
+            except Exception as e:
+                print(f"mu2e-docdb-{item.get('id')} - {stage} failed: {e}")
+                with self._lock:
+                    self.stats['failed'].append({"id": item.get('id'), "stage": stage, "error": str(e)})
+                result = None
+            with self._lock:
+                self.stats['stages'][stage]['items'] += 1
+                self.stats['stages'][stage]['busy_s'] += time.time() - start
+            if result is not None and out_q is not None:
+                out_q.put(result)
+        # the last worker of a stage shuts down the next stage
+        with self._lock:
+            remaining[stage] -= 1
+            last = remaining[stage] == 0
+        if last and out_q is not None:
+            next_stage = STAGES[STAGES.index(stage) + 1]
+            for _ in range(self.workers[next_stage]):
+                out_q.put(_STOP)
+
+    def run(self, docids):
+        """
+        Run all documents through the pipeline and wait for completion.
+
+        Args:
+            docids (list): docdb ids (int) or list_latest entries (dict with 'id' and 'last_updated')
+
+        Returns:
+            dict: stats with number of stored documents, failures, and per stage items/busy time
+        """
+        from mu2e.collections import get_collection
+        from mu2e.manifest import get_manifest
+        self.collections = [c or get_collection() for c in (self.collections or [self.db.collection])]
+        self.manifests = [get_manifest(c) for c in self.collections]
+        from mu2e.embedding_cache import get_embedding_cache
+        cache = get_embedding_cache(self.collections[0])
+        cache_counters = cache.counters() if cache else None
+        self.stats = {"stored": 0,
+                      "failed": [],
+                      "stages": {s: {"workers": self.workers[s], "items": 0, "busy_s": 0.} for s in STAGES}}
+
+        funcs = {"fetch": self._fetch, "parse": self._parse, "chunk": self._chunk,
+                 "embed": self._embed, "upsert": self._upsert}
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES]
+        remaining = dict(self.workers)
+
+        start = time.time()
+        threads = []
+        for i, stage in enumerate(STAGES):
+            out_q = queues[i+1] if i+1 < len(STAGES) else None
+            for n in range(self.workers[stage]):
+                t = threading.Thread(target=self._worker, name=f"mu2e-{stage}-{n}",
+                                     args=(stage, funcs[stage], queues[i], out_q, remaining),
+                                     daemon=True)
+                t.start()
+                threads.append(t)
+
+        # feeding blocks as soon as the fetch queue is full (backpressure)
+        for docid in docids:
+            item = dict(docid) if isinstance(docid, dict) else {"id": docid}
+            queues[0].put(item)
+        for _ in range(self.workers["fetch"]):
+            queues[0].put(_STOP)
+
+        for t in threads:
+            t.join()
+        self.stats['wall_s'] = time.time() - start
+        self._print_summary()
+        if cache:
+            print(cache.run_summary(cache_counters))
+        return self.stats
+
+    def _print_summary(self):
+        stages = self.stats['stages']
+        # busy time per worker approximates how long a stage would need on its own
+        per_worker = {s: stages[s]['busy_s'] / stages[s]['workers'] for s in STAGES}
+        slowest = max(per_worker, key=per_worker.get)
+        print(f"Pipeline stored {self.stats['stored']} documents in {self.stats['wall_s']:.1f}s "
+              f"({len(self.stats['failed'])} failed)")
+        for s in STAGES:
+            print(f"  {s:7s} workers={stages[s]['workers']:2d} items={stages[s]['items']:4d} "
+                  f"busy={stages[s]['busy_s']:7.1f}s per_worker={per_worker[s]:7.1f}s")
+        print(f"  slowest stage: {slowest}")
@@ -0,0 +1,166 @@
+"""
+In-process caches for repeated searches.
+
+The web UI and the chat LLM send the same queries again and again. The query cache keeps
+  - the embeddings of queries, keyed by the embedding model and the query text (for the argo
+    collection every query embedding is a remote round-trip), and
+  - the results of search.search, keyed by collection, query, filters and n_results.
+
+Cached results are tied to a version of the collection. tools.upsert_chunks and
+tools.delete_chunks bump the version (a small file in <chroma path>/collection_versions),
+so results cached by a long running process (web, MCP server) are not used anymore after
+an ingestion run in another process.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from .utils import get_chroma_path
+
+
+def _versions_dir():
+    return Path(get_chroma_path()) / "collection_versions"
+
+
+def collection_version(collection):
+    """
+    Current version of a collection, changes whenever chunks are stored or deleted.
+
+    Returns:
+        str: version ("0" if the collection was never changed since versioning exists)
+    """
+    try:
+        return (_versions_dir() / collection.name).read_text()
+    except FileNotFoundError:
+        return "0"
+
+
+_bump_lock = threading.Lock()
+
+
+def bump_version(collection):
+    """Mark a collection as changed, invalidates cached search results of all processes."""
+    path = _versions_dir() / collection.name
+    with _bump_lock:
+        os.makedirs(path.parent, exist_ok=True)
+        counter = int(collection_version(collection).split()[0]) + 1
+        # the timestamp keeps versions unique if two processes bump at the same time
+        tmp = path.with_name(f".{collection.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(f"{counter} {time.time_ns()}")
+        os.replace(tmp, path)
+
+
+class QueryCache:
+    """
+    LRU caches of query embeddings and search results.
+
+    Attributes:
+        size (int): maximum number of entries of each cache. Defaults to MU2E_QUERY_CACHE_SIZE or 1024.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or int(os.getenv('MU2E_QUERY_CACHE_SIZE', '1024'))
+        self._embeddings = OrderedDict()
+        self._results = OrderedDict()
+        self._counters = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+        self._lock = threading.Lock()
+
+    def _get(self, cache, key, name):
+        with self._lock:
+            value = cache.get(key)
+            if value is None:
+                self._counters[f"{name}_misses"] += 1
+            else:
+                cache.move_to_end(key)
+                self._counters[f"{name}_hits"] += 1
+            return value
+
+    def _put(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.size:
+                cache.popitem(last=False)
+
+    def embed_query(self, collection, query):
+        """
+        Embedding of a query with the embedding function of a collection.
+
+        Returns:
+            list: query embedding
+        """
+        key = (getattr(collection, 'embedding_model_id', None) or collection.name, query)
+        embedding = self._get(self._embeddings, key, "embedding")
+        if embedding is None:
+            embedding = collection._embed(input=[query], is_query=True)[0]
+            self._put(self._embeddings, key, embedding)
+        return embedding
+
+    def embed_queries(self, collection, queries):
+        """
+        Embeddings of several queries, the ones that are not cached are embedded in one call.
+
+        Returns:
+            list: one embedding per query
+        """
+        model = getattr(collection, 'embedding_model_id', None) or collection.name
+        embeddings = [self._get(self._embeddings, (model, q), "embedding") for q in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing:
+            new = dict(zip(missing, collection._embed(input=missing, is_query=True)))
+            for q, e in new.items():
+                self._put(self._embeddings, (model, q), e)
+            embeddings = [new[q] if e is None else e for q, e in zip(queries, embeddings)]
+        return embeddings
+
+    @staticmethod
+    def result_key(collection, query, where, n_results, include_metadata):
+        """Cache key of a search, including the current collection version."""
+        return (collection.name, collection_version(collection), query,
+                json.dumps(where, sort_keys=True, default=str), n_results, include_metadata)
+
+    def get_results(self, key):
+        """Cached search results (a copy, callers may modify it) or None."""
+        results = self._get(self._results, key, "result")
+        if results is None:
+            return None
+        return {k: list(v) if isinstance(v, list) else v for k, v in results.items()}
+
+    def put_results(self, key, results):
+        """Store search results (a copy)."""
+        self._put(self._results, key, {k: list(v) if isinstance(v, list) else v for k, v in results.items()})
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: number of entries, hits and misses of both caches
+        """
+        with self._lock:
+            return {"size": self.size,
+                    "embeddings": len(self._embeddings),
+                    "results": len(self._results),
+                    **self._counters}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Process-wide shared QueryCache, or None if disabled (MU2E_QUERY_CACHE=false)."""
+    global _cache
+    if os.getenv('MU2E_QUERY_CACHE', 'true').lower() != 'true':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryCache()
+        return _cache
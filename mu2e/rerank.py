@@ -0,0 +1,135 @@
+"""
+Cross-encoder re-ranking of search results.
+
+The bi-encoder collections find relevant chunks, but the order at the top is not precise.
+A cross-encoder scores every (query, chunk) pair jointly, which is much more precise and
+cheap enough on a CPU for a few dozen candidates. search.search_reranked over-fetches
+candidates and re-orders them with the Reranker.
+
+The model (MU2E_RERANK_MODEL) is loaded on first use. Scores are cached by (query, chunk id),
+so repeated queries only score new chunks. Re-ranking has a latency budget
+(MU2E_RERANK_BUDGET_S): the inference time per pair is measured, and a batch that would
+not finish within the budget is not started; the original order is kept instead.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Reranker:
+    """
+    Lazily loaded cross-encoder with a score cache.
+
+    Attributes:
+        model_name (str): sentence-transformers CrossEncoder model. Defaults to MU2E_RERANK_MODEL.
+        batch_size (int): pairs per inference batch. Defaults to MU2E_RERANK_BATCH_SIZE or 16.
+        cache_size (int): number of cached scores. Defaults to MU2E_RERANK_CACHE_SIZE or 20000.
+        budget_s (float): default latency budget in seconds. Defaults to MU2E_RERANK_BUDGET_S or 2.
+    """
+
+    def __init__(self, model_name=None, batch_size=None, cache_size=None, budget_s=None):
+        self.model_name = model_name or os.getenv('MU2E_RERANK_MODEL', DEFAULT_MODEL)
+        self.batch_size = batch_size or int(os.getenv('MU2E_RERANK_BATCH_SIZE', '16'))
+        self.cache_size = cache_size or int(os.getenv('MU2E_RERANK_CACHE_SIZE', '20000'))
+        self.budget_s = budget_s if budget_s is not None else float(os.getenv('MU2E_RERANK_BUDGET_S', '2'))
+        self.model = None
+        self.load_s = None
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.pair_s = None  # measured inference seconds per (query, chunk) pair
+        self._cache = OrderedDict()  # (query, chunk id, text hash) -> score
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+    def load(self):
+        """Load the model (done by the first score() call)."""
+        with self._model_lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+                start = time.time()
+                self.model = CrossEncoder(self.model_name, device='cpu')
+                self.load_s = time.time() - start
+        return self.model
+
+    def score(self, query, ids, texts, budget_s=None):
+        """
+        Cross-encoder scores of chunks for a query.
+
+        Args:
+            query (str): search query
+            ids (list): chunk ids (cache keys)
+            texts (list): chunk texts
+            budget_s (float, optional): give up before a batch would take the inference time over this
+                                        many seconds (loading the model is not counted). Defaults to self.budget_s.
+
+        Returns:
+            list: score per chunk (higher is more relevant), or None if the budget was exceeded
+        """
+        budget_s = self.budget_s if budget_s is None else budget_s
+        keys = [(query, chunk_id, hash(text)) for chunk_id, text in zip(ids, texts)]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self.hits += len(scores)
+        todo = [(key, text) for key, text in dict(zip(keys, texts)).items() if key not in scores]
+        with self._lock:
+            self.misses += len(todo)
+        if todo:
+            model = self.load()
+            start = time.time()
+            i = 0
+            while i < len(todo):
+                # without a measurement, a small first batch estimates the time per pair
+                batch = todo[i:i + (self.batch_size if self.pair_s is not None else min(self.batch_size, 4))]
+                if self.pair_s is not None and time.time() - start + self.pair_s * len(batch) > budget_s:
+                    # the scores of finished batches stay cached for the next call
+                    with self._lock:
+                        self.fallbacks += 1
+                    return None
+                t = time.time()
+                predicted = model.predict([(query, text) for _, text in batch], batch_size=self.batch_size)
+                pair_s = (time.time() - t) / len(batch)
+                with self._lock:
+                    self.pair_s = pair_s if self.pair_s is None else 0.8 * self.pair_s + 0.2 * pair_s
+                    for (key, _), s in zip(batch, predicted):
+                        scores[key] = self._cache[key] = float(s)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                i += len(batch)
+        return [scores[key] for key in keys]
+
+    def stats(self):
+        """
+        Returns:
+            dict: model, load time, inference time per pair, cache size, hits, misses and budget fallbacks
+        """
+        with self._lock:
+            return {"model": self.model_name,
+                    "loaded": self.model is not None,
+                    "load_s": self.load_s,
+                    "pair_ms": 1000 * self.pair_s if self.pair_s is not None else None,
+                    "cached": len(self._cache),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "fallbacks": self.fallbacks}
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Process-wide shared Reranker (the model is loaded on first use)."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker()
+        return _reranker
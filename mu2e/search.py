@@ -2,7 +2,7 @@
 Search and retrieval interface for ChromaDB collections with filtering capabilities.
 """
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 from .collections import get_collection
 from .utils import convert_to_timestamp, list_to_search_result
 from .docdb import docdb
@@ -29,8 +29,10 @@ def search(
         include_metadata: Whether to include full metadata in results
         
     Returns:
-        Dictionary with search results including documents, metadata, distances, and ids
+        Dictionary with search results including documents, metadata, distances, and ids.
+        Repeated searches are answered from the query cache (see mu2e.query_cache).
     """
+    from .query_cache import get_query_cache
     collection = collection or get_collection()
     
     # Build where clause from filters
@@ -39,9 +41,19 @@ def search(
         date_range=date_range
     )
     
+    cache = get_query_cache()
+    if cache is not None:
+        key = cache.result_key(collection, query, where_clause, n_results, include_metadata)
+        cached = cache.get_results(key)
+        if cached is not None:
+            return cached
+        query_input = {'query_embeddings': [cache.embed_query(collection, query)]}
+    else:
+        query_input = {'query_texts': [query]}
+    
     # Perform search
     results = collection.query(
-        query_texts=[query],
+        **query_input,
         n_results=n_results,
         where=where_clause if where_clause else None,
         include=['documents', 'metadatas', 'distances']
@@ -59,31 +71,132 @@ def search(
     if include_metadata:
         formatted_results['metadata'] = results['metadatas'][0]
     
+    if cache is not None:
+        cache.put_results(key, formatted_results)
     return formatted_results
 
 
+def search_many(
+    queries: List[str],
+    n_results: int = 5,
+    collection=None,
+    filters: Optional[Dict[str, Any]] = None,
+    date_range: Optional[Dict[str, Union[str, datetime, int]]] = None,
+    include_metadata: bool = True,
+    include_documents: bool = True,
+    batch_size: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Vector search for many queries at once: the queries are embedded in batches and each
+    batch is searched with a single ChromaDB query, which is much faster than calling
+    search() in a loop (e.g. to evaluate a benchmark).
+    
+    Args:
+        queries: Search query texts
+        n_results: Number of results per query
+        collection: ChromaDB collection (uses default if None)
+        filters: Raw ChromaDB where filters (dict), applied to all queries
+        date_range: Date filtering with 'start' and/or 'end' keys
+        include_metadata: Whether to include full metadata in results
+        include_documents: Whether to include the chunk texts ('documents' is omitted otherwise)
+        batch_size: Queries per embedding/query call. Defaults to MU2E_SEARCH_BATCH_SIZE or 64.
+        
+    Returns:
+        List with one dictionary per query in search() format
+    """
+    import os
+    collection = collection or get_collection()
+    batch_size = batch_size or int(os.getenv('MU2E_SEARCH_BATCH_SIZE', '64'))
+    where_clause = _build_where_clause(
+        filters=filters,
+        date_range=date_range
+    )
+    include = ['distances']
+    if include_documents:
+        include.append('documents')
+    if include_metadata:
+        include.append('metadatas')
+    
+    out = []
+    for i in range(0, len(queries), batch_size):
+        batch = list(queries[i:i + batch_size])
+        embeddings = embed_queries(batch, collection=collection, batch_size=batch_size)
+        results = collection.query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            where=where_clause if where_clause else None,
+            include=include
+        )
+        for k, query in enumerate(batch):
+            formatted_results = {
+                'query': query,
+                'n_results': len(results['ids'][k]),
+                'distances': results['distances'][k],
+                'ids': results['ids'][k]
+            }
+            if include_documents:
+                formatted_results['documents'] = results['documents'][k]
+            if include_metadata:
+                formatted_results['metadata'] = results['metadatas'][k]
+            out.append(formatted_results)
+    return out
+
+
+def embed_queries(queries: List[str], collection=None, batch_size: Optional[int] = None) -> List[Any]:
+    """
+    Embed queries with the embedding function of a collection, in batches and using the
+    query embedding cache (see mu2e.query_cache).
+    
+    Args:
+        queries: Query texts
+        collection: ChromaDB collection (uses default if None)
+        batch_size: Queries per embedding call. Defaults to MU2E_SEARCH_BATCH_SIZE or 64.
+        
+    Returns:
+        List with one embedding per query
+    """
+    import os
+    from .query_cache import get_query_cache
+    collection = collection or get_collection()
+    batch_size = batch_size or int(os.getenv('MU2E_SEARCH_BATCH_SIZE', '64'))
+    cache = get_query_cache()
+    embeddings = []
+    for i in range(0, len(queries), batch_size):
+        batch = list(queries[i:i + batch_size])
+        if cache is not None:
+            embeddings.extend(cache.embed_queries(collection, batch))
+        else:
+            embeddings.extend(collection._embed(input=batch, is_query=True))
+    return embeddings
+
+
 def search_fulltext(
     query: str,
     n_results: int = 5,
     collection=None,
     filters: Optional[Dict[str, Any]] = None,
     date_range: Optional[Dict[str, Union[str, datetime, int]]] = None,
-    include_metadata: bool = True
+    include_metadata: bool = True,
+    match_any: bool = False
 ) -> Dict[str, Any]:
     """
-    Full-text search using ChromaDB's native document search.
+    Full-text search ranked by BM25 (see mu2e.fulltext). Falls back to ChromaDB's
+    unranked `$contains` search if the collection has no complete full-text index.
     
     Args:
-        query: Search query text
+        query: Search query text, all words (or "quoted phrases") have to occur
         n_results: Number of results to return
         collection: ChromaDB collection (uses default if None)
         filters: Raw ChromaDB where filters (dict)
         date_range: Date filtering with 'start' and/or 'end' keys
         include_metadata: Whether to include full metadata in results
+        match_any: Match chunks with any of the words instead of all of them
         
     Returns:
-        Dictionary with search results matching search() format
+        Dictionary with search results matching search() format. 'scores' has the BM25
+        scores (higher is better), 'distances' maps them to 1/(1+score) (lower is better).
     """
+    from .fulltext import get_fulltext_index
     collection = collection or get_collection()
     
     # Build where clause from filters
@@ -92,43 +205,293 @@ def search_fulltext(
         date_range=date_range
     )
     
-    # Use ChromaDB's document search with contains operator
-    where_document = {"$contains": query}
+    index = get_fulltext_index()
+    if index is None or not index.is_complete(collection):
+        if index is not None:
+            import sys
+            print(f"Full-text index of {collection.name} is incomplete, using $contains "
+                  f"(run mu2e-docdb fulltext-index rebuild)", file=sys.stderr)
+        return _search_contains(query, n_results, collection, where_clause, include_metadata)
+
+    ids, scores, documents, metadatas = [], [], [], []
+    offset = 0
+    # without filters the first n_results matches are the result, with filters more are fetched until enough pass
+    batch_size = n_results if not where_clause else max(4 * n_results, 50)
+    while len(ids) < n_results:
+        hits = index.search(collection, query, limit=batch_size, offset=offset, match_any=match_any)
+        if not hits:
+            break
+        offset += len(hits)
+        found = collection.get(ids=[h[0] for h in hits],
+                               where=where_clause if where_clause else None,
+                               include=['documents', 'metadatas'])
+        found = {i: (d, m) for i, d, m in zip(found['ids'], found['documents'], found['metadatas'])}
+        for chunk_id, score in hits:
+            if chunk_id in found and len(ids) < n_results:
+                ids.append(chunk_id)
+                scores.append(score)
+                documents.append(found[chunk_id][0])
+                metadatas.append(found[chunk_id][1])
+        if len(hits) < batch_size:
+            break
+        batch_size *= 2
+
+    formatted_results = {
+        'query': query,
+        'n_results': len(ids),
+        'documents': documents,
+        'distances': [1. / (1. + s) for s in scores],
+        'scores': scores,
+        'ids': ids
+    }
     
-    try:
-        # Perform document-based search
-        results = collection.get(
-            where=where_clause if where_clause else None,
-            where_document=where_document,
-            limit=n_results,
-            include=['documents', 'metadatas']
-        )
-        
-        # Format results to match search() output
-        # For full-text search, we don't have distance scores, so we'll use a placeholder
-        formatted_results = {
-            'query': query,
-            'n_results': len(results['ids']),
-            'documents': results['documents'],
-            'distances': [0.5] * len(results['ids']),  # Placeholder distances for full-text
-            'ids': results['ids']
-        }
+    if include_metadata:
+        formatted_results['metadata'] = metadatas
+    
+    return formatted_results
+
+
+def search_hybrid(
+    query: str,
+    n_results: int = 5,
+    collection=None,
+    filters: Optional[Dict[str, Any]] = None,
+    date_range: Optional[Dict[str, Union[str, datetime, int]]] = None,
+    include_metadata: bool = True,
+    n_candidates: Optional[int] = None,
+    rrf_k: int = 60
+) -> Dict[str, Any]:
+    """
+    Hybrid search: vector search and BM25 keyword search (any of the words) run concurrently
+    and are fused with reciprocal-rank fusion, score = sum over both rankings of 1/(rrf_k + rank).
+    Finds chunks that match the meaning of a query as well as chunks with exact jargon
+    (run numbers, acronyms like CRV, part numbers) that the embedding models don't capture.
+    
+    Args:
+        query: Search query text
+        n_results: Number of results to return
+        collection: ChromaDB collection (uses default if None)
+        filters: Raw ChromaDB where filters (dict)
+        date_range: Date filtering with 'start' and/or 'end' keys
+        include_metadata: Whether to include full metadata in results
+        n_candidates: Number of results taken from each retriever. Defaults to max(4*n_results, 20).
+        rrf_k: Rank constant of the fusion, larger values weight lower ranks more
         
-        if include_metadata:
-            formatted_results['metadata'] = results['metadatas']
+    Returns:
+        Dictionary with search results matching search() format. 'scores' has the fused scores
+        (higher is better), 'distances' maps them to 0 (first in both rankings) .. 1,
+        'vector_ranks'/'keyword_ranks' the rank (1 based, None if not retrieved) in each ranking,
+        and 'timings' the latency of each stage in seconds.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import time
+    start = time.perf_counter()
+    collection = collection or get_collection()
+    n_candidates = n_candidates or max(4 * n_results, 20)
+    kwargs = dict(n_results=n_candidates, collection=collection, filters=filters,
+                  date_range=date_range, include_metadata=True)
+
+    def timed(func, **extra):
+        t = time.perf_counter()
+        return func(query, **kwargs, **extra), time.perf_counter() - t
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        vector_future = executor.submit(timed, search)
+        keyword_future = executor.submit(timed, search_fulltext, match_any=True)
+        (vector, vector_s), (keyword, keyword_s) = vector_future.result(), keyword_future.result()
+
+    t = time.perf_counter()
+    chunks = {}  # id -> [score, document, metadata, vector rank, keyword rank]
+    for which, results in ((3, vector), (4, keyword)):
+        for rank, (chunk_id, document, metadata) in enumerate(
+                zip(results['ids'], results['documents'], results['metadata']), start=1):
+            entry = chunks.setdefault(chunk_id, [0., document, metadata, None, None])
+            entry[0] += 1. / (rrf_k + rank)
+            entry[which] = rank
+    best = sorted(chunks.items(), key=lambda item: item[1][0], reverse=True)[:n_results]
+    fusion_s = time.perf_counter() - t
+
+    max_score = 2. / (rrf_k + 1)
+    formatted_results = {
+        'query': query,
+        'n_results': len(best),
+        'documents': [e[1] for _, e in best],
+        'distances': [1. - e[0] / max_score for _, e in best],
+        'scores': [e[0] for _, e in best],
+        'ids': [chunk_id for chunk_id, _ in best],
+        'vector_ranks': [e[3] for _, e in best],
+        'keyword_ranks': [e[4] for _, e in best],
+        'timings': {'vector_s': vector_s,
+                    'keyword_s': keyword_s,
+                    'fusion_s': fusion_s,
+                    'total_s': time.perf_counter() - start}
+    }
+    
+    if include_metadata:
+        formatted_results['metadata'] = [e[2] for _, e in best]
+    
+    return formatted_results
+
+
+def search_reranked(
+    query: str,
+    n_results: int = 5,
+    collection=None,
+    mode: str = "vector",
+    n_candidates: Optional[int] = None,
+    budget_s: Optional[float] = None,
+    include_metadata: bool = True,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Search with cross-encoder re-ranking (see mu2e.rerank): over-fetches candidates with the
+    vector, hybrid or full-text search and re-orders them by the cross-encoder score. If the
+    re-ranking takes longer than the latency budget, the candidates keep their original order.
+    
+    Args:
+        query: Search query text
+        n_results: Number of results to return
+        collection: ChromaDB collection (uses default if None)
+        mode: 'vector' (search), 'hybrid' (search_hybrid) or 'fulltext' (search_fulltext)
+        n_candidates: Number of candidates to re-rank. Defaults to MU2E_RERANK_CANDIDATES or max(4*n_results, 20).
+        budget_s: Latency budget of the re-ranking in seconds. Defaults to MU2E_RERANK_BUDGET_S or 2.
+        include_metadata: Whether to include full metadata in results
+        **kwargs: Additional arguments (filters, date_range, ...) passed to the search function
         
-        return formatted_results
+    Returns:
+        Dictionary with search results matching the format of the search function. 'reranked' tells
+        if the cross-encoder order was used, 'rerank_scores' has its scores (higher is better)
+        and 'distances' maps them to 0..1 (lower is better). 'timings' has 'search_s' and 'rerank_s'.
+    """
+    import math
+    import os
+    import time
+    from .rerank import get_reranker
+    funcs = {"vector": search, "hybrid": search_hybrid, "fulltext": search_fulltext}
+    if mode not in funcs:
+        raise ValueError(f"Unknown search mode '{mode}'. Available: {', '.join(funcs)}")
+    n_candidates = n_candidates or int(os.getenv('MU2E_RERANK_CANDIDATES', '0')) or max(4 * n_results, 20)
+    n_candidates = max(n_candidates, n_results)
+    
+    start = time.perf_counter()
+    results = funcs[mode](query, collection=collection, n_results=n_candidates,
+                          include_metadata=include_metadata, **kwargs)
+    search_s = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    scores = get_reranker().score(query, results['ids'], results['documents'], budget_s=budget_s)
+    rerank_s = time.perf_counter() - start
+    
+    n = len(results['ids'])
+    if scores is None:
+        order = list(range(n))[:n_results]
+    else:
+        order = sorted(range(n), key=lambda i: scores[i], reverse=True)[:n_results]
+    for key, value in list(results.items()):
+        if isinstance(value, list) and len(value) == n:
+            results[key] = [value[i] for i in order]
+    results['n_results'] = len(order)
+    results['reranked'] = scores is not None
+    if scores is not None:
+        results['rerank_scores'] = [scores[i] for i in order]
+        # cross-encoder scores are logits, 1 - sigmoid keeps "lower is better"
+        results['distances'] = [1. - 1. / (1. + math.exp(-max(min(scores[i], 50.), -50.))) for i in order]
+    results['timings'] = {**results.get('timings', {}), 'search_s': search_s, 'rerank_s': rerank_s}
+    return results
+
+
+def search_documents(
+    query: str,
+    n_results: int = 5,
+    collection=None,
+    max_chunks_per_doc: int = 1,
+    mode: str = "vector",
+    include_metadata: bool = True,
+    rerank: bool = False,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Search for distinct documents: over-fetches chunks and keeps the best max_chunks_per_doc
+    chunks of each document (by doc_id), so that a long document with many matching chunks
+    doesn't fill all result slots.
+    
+    Args:
+        query: Search query text
+        n_results: Number of distinct documents to return
+        collection: ChromaDB collection (uses default if None)
+        max_chunks_per_doc: Maximum number of chunks per document
+        mode: 'vector' (search), 'hybrid' (search_hybrid) or 'fulltext' (search_fulltext)
+        include_metadata: Whether to include full metadata in results
+        rerank: Re-rank the chunks with the cross-encoder first (see search_reranked)
+        **kwargs: Additional arguments (filters, date_range, ...) passed to the search function
         
-    except Exception as e:
-        # Return empty results if search fails
-        return {
-            'query': query,
-            'n_results': 0,
-            'documents': [],
-            'distances': [],
-            'ids': [],
-            'metadata': [] if include_metadata else None
-        }
+    Returns:
+        Dictionary with search results matching the format of the search function, with the
+        chunks of a document next to each other (documents ordered by their best chunk).
+        'n_documents' is the number of distinct documents.
+    """
+    funcs = {"vector": search, "hybrid": search_hybrid, "fulltext": search_fulltext}
+    if mode not in funcs:
+        raise ValueError(f"Unknown search mode '{mode}'. Available: {', '.join(funcs)}")
+    if rerank:
+        kwargs['mode'] = mode
+        func = search_reranked
+    else:
+        func = funcs[mode]
+    collection = collection or get_collection()
+    n_chunks = n_results * max_chunks_per_doc * 4
+    total = collection.count()
+    while True:
+        n_chunks = max(1, min(n_chunks, total))
+        results = func(query, collection=collection, n_results=n_chunks, include_metadata=True, **kwargs)
+        groups = {}  # doc_id -> indices of its kept chunks, in order of the first chunk
+        for i, metadata in enumerate(results['metadata']):
+            doc_id = (metadata or {}).get('doc_id', results['ids'][i])
+            if doc_id not in groups and len(groups) >= n_results:
+                continue
+            chunks = groups.setdefault(doc_id, [])
+            if len(chunks) < max_chunks_per_doc:
+                chunks.append(i)
+        # fewer results than requested: there are no more chunks to fetch
+        if len(groups) >= n_results or results['n_results'] < n_chunks or n_chunks >= total:
+            break
+        n_chunks *= 4
+
+    keep = [i for chunks in groups.values() for i in chunks]
+    n = len(results['ids'])
+    for key, value in results.items():
+        if isinstance(value, list) and len(value) == n:
+            results[key] = [value[i] for i in keep]
+    results['n_results'] = len(keep)
+    results['n_documents'] = len(groups)
+    if not include_metadata:
+        results.pop('metadata')
+    return results
+
+
+def _search_contains(query, n_results, collection, where_clause, include_metadata):
+    """Unranked substring search with ChromaDB's `$contains` operator."""
+    results = collection.get(
+        where=where_clause if where_clause else None,
+        where_document={"$contains": query},
+        limit=n_results,
+        include=['documents', 'metadatas']
+    )
+    
+    # Format results to match search() output
+    # $contains has no relevance scores, so we'll use a placeholder
+    formatted_results = {
+        'query': query,
+        'n_results': len(results['ids']),
+        'documents': results['documents'],
+        'distances': [0.5] * len(results['ids']),  # Placeholder distances for full-text
+        'ids': results['ids']
+    }
+    
+    if include_metadata:
+        formatted_results['metadata'] = results['metadatas']
+    
+    return formatted_results
 
 
 def search_by_date(
@@ -0,0 +1,240 @@
+"""
+Disk spooling for downloaded files and extracted images.
+
+Downloads are streamed in chunks into temporary files (SpooledDocument) instead of being held
+in memory as a whole, and parsers write every extracted image to disk as soon as it is
+encoded (ImageSpool), loading it again only when it is used. This keeps the memory of a
+document bounded by the largest single image instead of the sum of all attachments and figures.
+
+The spool lives in MU2E_SPOOL_DIR (defaults to <tmp>/mu2e-spool). Set MU2E_SPOOL=false to keep
+everything in memory as before.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+
+
+def use_spool():
+    """Check if downloads and images are spooled to disk (MU2E_SPOOL, default true)."""
+    return os.getenv('MU2E_SPOOL', 'true').lower() == 'true'
+
+
+def get_spool_dir():
+    """Directory for spooled files, created if necessary."""
+    spool_dir = Path(os.getenv('MU2E_SPOOL_DIR') or Path(tempfile.gettempdir()) / "mu2e-spool")
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    return spool_dir
+
+
+def _remove(path):
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.unlink(path)
+    except OSError:
+        pass
+
+
+class SpooledDocument(io.RawIOBase):
+    """
+    A file on disk that behaves like the io.BytesIO the parsers used to get.
+
+    Parsers should open it by path (see BaseParser._source). read/seek/getvalue are kept for
+    compatibility; getvalue reads the whole file into memory.
+
+    Attributes:
+        path (str): location of the file
+        owned (bool): the file is removed when this object is garbage collected
+    """
+
+    def __init__(self, path, owned=True):
+        super().__init__()
+        self.path = str(path)
+        self._fh = None
+        self._finalizer = weakref.finalize(self, _remove, self.path) if owned else None
+
+    @property
+    def owned(self):
+        return self._finalizer is not None and self._finalizer.alive
+
+    @classmethod
+    def from_response(cls, response, chunk_size=1024**2):
+        """
+        Stream the body of a requests response (opened with stream=True) into a spool file.
+
+        Args:
+            response: requests.Response
+            chunk_size (int): bytes per read
+
+        Returns:
+            SpooledDocument
+        """
+        fd, path = tempfile.mkstemp(prefix="doc_", dir=get_spool_dir())
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+        except BaseException:
+            _remove(path)
+            raise
+        return cls(path)
+
+    def _handle(self):
+        if self._fh is None:
+            self._fh = open(self.path, 'rb')
+        return self._fh
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        return self._handle().readinto(b)
+
+    def read(self, size=-1):
+        return self._handle().read(size)
+
+    def seek(self, offset, whence=0):
+        return self._handle().seek(offset, whence)
+
+    def tell(self):
+        return self._handle().tell()
+
+    def getvalue(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open(self):
+        """New independent binary file handle."""
+        return open(self.path, 'rb')
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        super().close()
+
+    def __getstate__(self):
+        # other processes only read the file, the sender stays the owner
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], owned=False)
+
+
+class ImageSpool:
+    """
+    List of base64 encoded images kept on disk, one file per image, loaded lazily.
+
+    Supports append, len, indexing, iteration and comparison with lists. When pickled
+    (e.g. sent back from a parser process), ownership of the files moves to the receiver.
+
+    Attributes:
+        path (str): directory with the image files
+    """
+
+    def __init__(self, path=None, owned=None):
+        """
+        Args:
+            path (str, optional): existing spool directory to attach to. A new one is created if None.
+            owned (bool, optional): remove the directory when garbage collected.
+                                    Defaults to True for new and False for existing directories.
+        """
+        if path is None:
+            path = tempfile.mkdtemp(prefix="img_", dir=get_spool_dir())
+            owned = True if owned is None else owned
+        self.path = str(path)
+        self._count = len([n for n in os.listdir(self.path) if n.endswith(".b64")])
+        self._finalizer = weakref.finalize(self, _remove, self.path) if owned else None
+
+    def _file(self, i):
+        return os.path.join(self.path, f"{i:06d}.b64")
+
+    def append(self, image_base64):
+        with open(self._file(self._count), 'w') as f:
+            f.write(image_base64)
+        self._count += 1
+
+    def extend(self, images):
+        for image in images:
+            self.append(image)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("image index out of range")
+        with open(self._file(i), 'r') as f:
+            return f.read()
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __eq__(self, other):
+        if isinstance(other, (ImageSpool, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ImageSpool({self._count} images in {self.path})"
+
+    def move_to(self, dest):
+        """
+        Move the images to a permanent directory, after which they are no longer removed automatically.
+
+        Args:
+            dest (str): target directory (must not exist)
+
+        Returns:
+            ImageSpool: attached to dest
+        """
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+        os.makedirs(os.path.dirname(str(dest)), exist_ok=True)
+        shutil.move(self.path, str(dest))
+        self.path = str(dest)
+        return self
+
+    def remove(self):
+        """Remove the images from disk."""
+        if self._finalizer is not None:
+            self._finalizer()
+        else:
+            _remove(self.path)
+        self._count = 0
+
+    def __getstate__(self):
+        # hand the files over to the receiver (e.g. the parent of a parser process)
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], owned=True)
+
+
+def image_list():
+    """Container for extracted images: an ImageSpool, or a list if spooling is disabled."""
+    return ImageSpool() if use_spool() else []
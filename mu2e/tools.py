@@ -1,18 +1,18 @@
 import json
 import os
-import numpy as np
 from pathlib import Path
 from dotenv import load_dotenv
-from .utils import get_data_dir, convert_to_timestamp, get_chroma_path
+from .utils import get_data_dir, convert_to_timestamp, get_chroma_path, index_size_mb
 from .collections import get_collection, collection_names
 from .docdb import docdb
 from .chunking import chunk_text_simple
+from .manifest import get_manifest
+from .embedding_cache import get_embedding_cache
+from .query_cache import bump_version
+from .fulltext import get_fulltext_index
 import threading
 import time
 from datetime import datetime
-import tiktoken
-from openai import OpenAI
-from tqdm import tqdm
 
 
 
@@ -29,7 +29,84 @@ def saveInCollection(doc, collection=None, chunking_strategy="default"):
         chunking_strategy: Strategy for chunking ('semantic', 'sentence', 'paragraph', 'token')
     """
     load_dotenv()
+    collection = collection or get_collection() 
+    documents_, metadatas_, ids_ = chunk_document(doc, collection=collection, chunking_strategy=chunking_strategy)
+    # with the embedding cache only new chunk texts are embedded, otherwise the collection embeds them
+    embeddings = embed_chunks(collection, documents_) if get_embedding_cache(collection) else None
+    upsert_chunks(collection, f"mu2e-docdb-{doc['docid']}", documents_, metadatas_, ids_, embeddings=embeddings)
+
+
+def save_in_collections(doc, collections, chunking_strategy="default"):
+    """
+    Save a document to several collections in one pass: the text is chunked once per chunk size
+    (see chunk_for_collections) and the collections embed their chunks in parallel.
+
+    Args:
+        doc: Document dictionary with 'files' key
+        collections: list of ChromaDB collections (None is the default collection)
+        chunking_strategy: Strategy for chunking, see chunking.chunk_text_simple
+
+    Returns:
+        list: number of stored chunks per collection
+    """
+    load_dotenv()
+    collections = [c or get_collection() for c in collections]
+    chunks = chunk_for_collections(doc, collections, chunking_strategy=chunking_strategy)
+    embeddings = embed_for_collections(collections, chunks)
+    for collection, (documents_, metadatas_, ids_), embeddings_ in zip(collections, chunks, embeddings):
+        upsert_chunks(collection, f"mu2e-docdb-{doc['docid']}", documents_, metadatas_, ids_, embeddings=embeddings_)
+    return [len(ids_) for _, _, ids_ in chunks]
+
+
+def _chunk_size(collection):
+    """Chunk size used by chunk_document for a collection."""
+    return getattr(collection, 'max_input', 256) if collection else 256
+
+
+def chunk_for_collections(doc, collections, chunking_strategy="default"):
+    """
+    Chunk a document for several collections, once per distinct chunk size (max_input).
+    Collections with the same chunk size share the (identical) chunk lists.
+
+    Returns:
+        list: (documents, metadatas, ids) per collection
+    """
+    by_size = {}
+    for collection in collections:
+        size = _chunk_size(collection)
+        if size not in by_size:
+            by_size[size] = chunk_document(doc, collection=collection, chunking_strategy=chunking_strategy)
+    return [by_size[_chunk_size(c)] for c in collections]
+
+
+def embed_for_collections(collections, chunks):
+    """
+    Embed the chunks of several collections (output of chunk_for_collections) in parallel,
+    one thread per collection, i.e. per embedding model.
+
+    Returns:
+        list: embeddings per collection
+    """
+    if len(collections) <= 1:
+        return [embed_chunks(c, documents) for c, (documents, _, _) in zip(collections, chunks)]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(collections)) as executor:
+        futures = [executor.submit(embed_chunks, c, documents) for c, (documents, _, _) in zip(collections, chunks)]
+        return [f.result() for f in futures]
+
 
+def chunk_document(doc, collection=None, chunking_strategy="default"):
+    """
+    Split a parsed document into the chunks that are stored in a collection.
+
+    Args:
+        doc: Document dictionary with 'files' key
+        collection: ChromaDB collection (optional), used for the chunk size (max_input)
+        chunking_strategy: Strategy for chunking, see chunking.chunk_text_simple
+
+    Returns:
+        tuple: (documents, metadatas, ids) lists ready for collection.upsert
+    """
     docid = f"mu2e-docdb-{doc['docid']}"
     base_meta = {k: v for k, v in doc.items() if k != "files"}
     base_meta['doc_type'] = "mu2e-docdb"
@@ -69,7 +146,7 @@ def saveInCollection(doc, collection=None, chunking_strategy="default"):
         for chunk_idx, chunk_text in enumerate(chunks):
             # Create metadata for this chunk
             chunk_meta = base_meta.copy()
-            chunk_meta.update({k: v for k, v in file_data.items() if k not in {"text", "document"}})
+            chunk_meta.update({k: v for k, v in file_data.items() if k not in {"text", "document", "images"}})
             chunk_meta['chunk_id'] = chunk_idx
             chunk_meta['total_chunks'] = len(chunks)
             chunk_meta['file_index'] = file_idx
@@ -96,22 +173,234 @@ def saveInCollection(doc, collection=None, chunking_strategy="default"):
         chunk_id = f"{docid}_{-1}_{0}"
         ids_.append(chunk_id)
 
-    collection = collection or get_collection() 
-
-    if len(ids_) < 1:
-        print(f"{docid} has no documents/chunks to store")
-        return 
-    
     if len(ids_) > 1000:
         print(f"{len(ids_)} chunks - thats more than {1000}, that doesn't sound right: {docid}")
         ids_ = ids_[:1000]
         metadatas_ = metadatas_[:1000]
         documents_ = documents_[:1000]
-    print(f"Storing {len(ids_)} chunks for document {docid}")
+    return documents_, metadatas_, ids_
+
+
+def embed_chunks(collection, documents):
+    """
+    Compute the embeddings of chunk texts with the embedding function of a collection.
+    Chunks that are in the embedding cache (see embedding_cache) are not embedded again.
+
+    Args:
+        collection: ChromaDB collection
+        documents: List of chunk texts
+
+    Returns:
+        list: one embedding per document
+    """
+    if not documents:
+        return []
+    cache = get_embedding_cache(collection)
+    if cache is None:
+        return collection._embedding_function(input=documents)
+    model = collection.embedding_model_id
+    embeddings = cache.get_many(model, documents)
+    missing = [k for k, e in enumerate(embeddings) if e is None]
+    if missing:
+        new_embeddings = collection._embedding_function(input=[documents[k] for k in missing])
+        new_embeddings = [list(map(float, e)) for e in new_embeddings]
+        cache.put_many(model, [documents[k] for k in missing], new_embeddings)
+        for k, e in zip(missing, new_embeddings):
+            embeddings[k] = e
+    return embeddings
+
+
+def upsert_chunks(collection, docid, documents, metadatas, ids, embeddings=None):
+    """
+    Store chunks (see chunk_document) in a collection.
+
+    Args:
+        collection: ChromaDB collection
+        docid: Document id (mu2e-docdb-XXXXX), only used for logging
+        documents, metadatas, ids: Output of chunk_document
+        embeddings: Precomputed embeddings (optional). If None, the collection embeds the documents.
+    """
+    if len(ids) < 1:
+        print(f"{docid} has no documents/chunks to store")
+        return 
+    print(f"Storing {len(ids)} chunks for document {docid}")
+    kwargs = {}
+    if embeddings is not None:
+        kwargs['embeddings'] = embeddings
+    index = get_fulltext_index()
+    if index is not None:
+        index.ensure(collection)  # before the upsert, a new index of an empty collection is complete
     collection.upsert(
-        documents=documents_,
-        metadatas=metadatas_,
-        ids=ids_)
+        documents=documents,
+        metadatas=metadatas,
+        ids=ids,
+        **kwargs)
+    if index is not None:
+        index.upsert(collection, ids, documents, metadatas)
+    bump_version(collection)  # invalidates cached search results
+    # the new chunks are in place, now remove what is left from a previous version
+    delete_stale_chunks(collection, docid, ids)
+
+
+def update_document(doc, collection=None, chunking_strategy="default"):
+    """
+    Store an updated version of an already stored document (e.g. after adding image descriptions),
+    re-embedding only the chunks whose text changed. The other chunks keep their stored embeddings.
+
+    Args:
+        doc: Document dictionary with 'files' key
+        collection: ChromaDB collection (uses default if None)
+        chunking_strategy: Strategy for chunking, see chunking.chunk_text_simple
+
+    Returns:
+        int: number of re-embedded chunks
+    """
+    collection = collection or get_collection()
+    documents, metadatas, ids = chunk_document(doc, collection=collection, chunking_strategy=chunking_strategy)
+    stored = collection.get(ids=ids, include=['documents', 'embeddings'])
+    old = {i: (d, e) for i, d, e in zip(stored['ids'], stored['documents'], stored['embeddings'])}
+    changed = [k for k, (i, d) in enumerate(zip(ids, documents)) if i not in old or old[i][0] != d]
+    new_embeddings = embed_chunks(collection, [documents[k] for k in changed])
+    embeddings = [old[i][1] if i in old else None for i in ids]
+    for k, e in zip(changed, new_embeddings):
+        embeddings[k] = e
+    embeddings = [list(map(float, e)) for e in embeddings]
+    upsert_chunks(collection, f"mu2e-docdb-{doc['docid']}", documents, metadatas, ids, embeddings=embeddings)
+    return len(changed)
+
+
+def delete_chunks(collection, ids, batch_size=1000):
+    """
+    Delete chunks from a collection in batches.
+
+    Args:
+        collection: ChromaDB collection
+        ids: chunk ids to delete
+        batch_size: number of ids per delete call
+
+    Returns:
+        int: number of deleted ids
+    """
+    ids = list(ids)
+    index = get_fulltext_index()
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[i:i+batch_size])
+        if index is not None:
+            index.delete(collection, ids[i:i+batch_size])
+    if ids:
+        bump_version(collection)  # invalidates cached search results
+    return len(ids)
+
+
+def delete_stale_chunks(collection, docid, keep_ids):
+    """
+    Delete the chunks of a document that are not part of its current version, e.g. higher
+    chunk or file indices of a previous, longer version. Called after the upsert of the new
+    chunks, so the document is never missing from the collection.
+
+    Args:
+        collection: ChromaDB collection
+        docid: Document ID (mu2e-docdb-XXXXX)
+        keep_ids: chunk ids of the current version
+
+    Returns:
+        int: number of deleted chunks
+    """
+    existing = collection.get(where={"doc_id": docid}, include=[])['ids']
+    keep_ids = set(keep_ids)
+    stale = [i for i in existing if i not in keep_ids]
+    if stale:
+        print(f"Removing {len(stale)} stale chunks of document {docid}")
+        delete_chunks(collection, stale)
+    return len(stale)
+
+
+def find_stale_chunks(collection, batch_size=1000):
+    """
+    Scan a collection for chunks that are orphaned or belong to a superseded version.
+
+    A chunk is stale if
+    - it has no doc_id or its id doesn't belong to its doc_id (orphaned),
+    - a newer version of its document is stored,
+    - its chunk index is beyond the total_chunks of the file's current first chunk,
+    - it is the abstract-only placeholder of a document that has file chunks.
+
+    Args:
+        collection: ChromaDB collection
+        batch_size: number of chunks read per call
+
+    Returns:
+        tuple: (list of stale ids, number of scanned chunks)
+    """
+    docs = {}
+    stale = []
+    scanned = 0
+    offset = 0
+    while True:
+        res = collection.get(include=['metadatas'], limit=batch_size, offset=offset)
+        if not res['ids']:
+            break
+        offset += len(res['ids'])
+        scanned += len(res['ids'])
+        for id_, meta in zip(res['ids'], res['metadatas']):
+            meta = meta or {}
+            doc_id = meta.get('doc_id')
+            if not doc_id or not id_.startswith(f"{doc_id}_"):
+                stale.append(id_)
+                continue
+            docs.setdefault(doc_id, []).append((id_, meta))
+
+    for doc_id, chunks in docs.items():
+        versions = [m.get('version') for _, m in chunks if isinstance(m.get('version'), int)]
+        latest = max(versions) if versions else None
+        current = []
+        for id_, meta in chunks:
+            version = meta.get('version')
+            if latest is not None and isinstance(version, int) and version < latest:
+                stale.append(id_)
+            else:
+                current.append((id_, meta))
+        # chunk 0 of every file is always rewritten, its total_chunks is authoritative
+        totals = {m.get('file_index'): m.get('total_chunks') for _, m in current if m.get('chunk_id') == 0}
+        has_files = any(m.get('file_index', -1) >= 0 for _, m in current)
+        for id_, meta in current:
+            file_index = meta.get('file_index')
+            total = totals.get(file_index)
+            if file_index == -1 and has_files:
+                stale.append(id_)
+            elif total is not None and meta.get('chunk_id', 0) >= total:
+                stale.append(id_)
+    return stale, scanned
+
+
+def compact_collection(collection=None, batch_size=1000, dry_run=False):
+    """
+    Remove orphaned and stale-version chunks from a collection (see find_stale_chunks).
+
+    Args:
+        collection: ChromaDB collection (uses default if None)
+        batch_size: number of chunks read/deleted per call
+        dry_run: only report what would be removed
+
+    Returns:
+        dict: chunks before/after, number of removed chunks and size of the collection's HNSW index
+              before/after (MB, see utils.index_size_mb)
+    """
+    collection = collection or get_collection()
+    size_before = index_size_mb(collection)
+    count_before = collection.count()
+    stale, scanned = find_stale_chunks(collection, batch_size=batch_size)
+    print(f"Scanned {scanned} chunks of {collection.name}, {len(stale)} are stale")
+    if not dry_run and stale:
+        delete_chunks(collection, stale, batch_size=batch_size)
+    report = {"collection": collection.name,
+              "chunks_before": count_before,
+              "chunks_after": collection.count(),
+              "removed": 0 if dry_run else len(stale),
+              "stale": len(stale),
+              "index_mb_before": size_before,
+              "index_mb_after": index_size_mb(collection)}
+    return report
 
 
 def loadFromCollection(docid, nodb=False, collection=None, reconstruct_files=True):
@@ -172,6 +461,7 @@ def loadFromCollection(docid, nodb=False, collection=None, reconstruct_files=Tru
             'text': document,
             'metadata': metadata
         }
+    import tiktoken
     encoding = tiktoken.get_encoding("cl100k_base")
     # Reconstruct files by combining chunks
     for file_idx in sorted(files_chunks.keys()):
@@ -317,15 +607,14 @@ def _get_summary_claude(doc, model):
 
 
 def generate_from_local_all():
-    """wrapper for generate_from_local that automatically generates all non-default collections"""
-    for collection_name in collection_names:
-        if collection_name not in ["default"]:
-            print(f"Generating {collection_name} collection...")
-            c = get_collection(collection_name)
-            generate_from_local(c)
+    """wrapper for generate_from_local that generates all non-default collections in one pass"""
+    names = [n for n in collection_names if n not in ["default"]]
+    print(f"Generating {', '.join(names)} collections...")
+    generate_from_local(collections=[get_collection(n) for n in names])
 
 
-def generate_from_local(collection=None, chunking_strategy="default", base_path=None, docid=None):
+def generate_from_local(collection=None, chunking_strategy="default", base_path=None, docid=None,
+                        reparse=False, pool=None, collections=None):
     """
     Generate embeddings from locally stored documents (meta.json files) into a ChromaDB collection.
     This is useful for regenerating collections with different settings without re-downloading.
@@ -335,6 +624,12 @@ def generate_from_local(collection=None, chunking_strategy="default", base_path=
         chunking_strategy: Strategy for chunking text (default: "default")
         base_path: Base path for documents (defaults to ~/.mu2e/data)
         docid: Specific document ID to process (e.g., "mu2e-docdb-12345"). If None, processes all documents.
+        reparse: Parse the locally stored raw files again instead of using the text in meta.json
+                 (the documents are stored even if their version is unchanged)
+        pool: ParsePool used for reparse (optional), see docdb.parse_files
+        collections: list of collections to generate in one pass (optional, replaces collection).
+                     Every meta.json is read once and stored in the collections that don't have
+                     its version yet, see save_in_collections.
     Returns:
         int: Number of documents successfully processed
     """
@@ -367,7 +662,12 @@ def generate_from_local(collection=None, chunking_strategy="default", base_path=
         print(f"Generating embeddings for {len(doc_dirs)} documents")
     
     processed_count = 0
+    collections = [c or get_collection() for c in (collections or [collection])]
+    manifests = [get_manifest(c) for c in collections]
+    cache = get_embedding_cache(collections[0])
+    cache_counters = cache.counters() if cache else None
     
+    from tqdm import tqdm
     for doc_dir in tqdm(doc_dirs, desc="Processing documents"):
         meta_file = doc_dir / "meta.json"
         
@@ -380,12 +680,18 @@ def generate_from_local(collection=None, chunking_strategy="default", base_path=
             with open(meta_file, 'r') as f:
                 doc = json.load(f)
 
-            doc_ = load2(doc['doc_id'], nodb=True, collection=collection) # check if we already have this cached
-            if not doc_ is None:
+            if reparse:
+                _reparse_local(doc, doc_dir, pool=pool)
+
+            # collections that don't have this version yet
+            targets = [(c, m) for c, m in zip(collections, manifests) if reparse or not m.is_current(doc['doc_id'], doc)]
+            if not targets: # same version already stored
                 print(doc['doc_id']+" - present")
             else:
                 print(doc['doc_id']+" - processing")
-                saveInCollection(doc, collection=collection, chunking_strategy=chunking_strategy)
+                save_in_collections(doc, [c for c, _ in targets], chunking_strategy=chunking_strategy)
+                for _, m in targets:
+                    m.update(doc)
             processed_count += 1
             
         except Exception as e:
@@ -393,19 +699,47 @@ def generate_from_local(collection=None, chunking_strategy="default", base_path=
             continue
     
     print(f"Successfully processed {processed_count} documents")
+    if cache:
+        print(cache.run_summary(cache_counters))
     
     # Save timestamp
-    collection_name = getattr(collection, 'name', 'default') if collection else 'default'
-    timestamp_file = Path(get_data_dir()) / f"last_generate_{collection_name}.json"
     Path(get_data_dir()).mkdir(exist_ok=True)
-    
-    with open(timestamp_file, 'w') as f:
-        json.dump({"last_run": datetime.now().isoformat(), "processed": processed_count}, f)
+    for c in collections:
+        collection_name = 'default' if getattr(c, 'short_name', None) == 'default' else c.name
+        timestamp_file = Path(get_data_dir()) / f"last_generate_{collection_name}.json"
+        with open(timestamp_file, 'w') as f:
+            json.dump({"last_run": datetime.now().isoformat(), "processed": processed_count}, f)
     
     return processed_count
 
-def start_background_generate(interval_minutes=5, days=1, collection=None, from_local=False):
-    """Start background generation every interval_minutes"""
+def _reparse_local(doc, doc_dir, pool=None):
+    """Parse the raw files stored next to meta.json (see docdb.saveFiles) and update the file texts."""
+    from .spool import SpooledDocument
+    files = []
+    for f in doc['files']:
+        raw = doc_dir / f.get('filename', '')
+        if f.get('filename') and raw.is_file():
+            f['document'] = SpooledDocument(raw, owned=False)  # parsed from the stored file
+            files.append(f)
+    docdb(login=False).parse_files({'files': files}, add_image_descriptions=False, pool=pool)
+    for f in files:
+        f.pop('document', None)
+    return doc
+
+
+def start_background_generate(interval_minutes=5, days=1, collection=None, from_local=False,
+                              pipeline=False, workers=None):
+    """
+    Start background generation every interval_minutes
+
+    Args:
+        interval_minutes (int): minutes to sleep between runs
+        days (int): number of days to look back in docdb
+        collection: ChromaDB collection (uses default if None)
+        from_local (bool): generate from the locally stored documents instead of docdb
+        pipeline (bool): use the staged concurrent pipeline, see mu2e.pipeline
+        workers (dict or str, optional): worker count per pipeline stage
+    """
     def background_loop():
         from mu2e import docdb
         while True:
@@ -415,7 +749,7 @@ def start_background_generate(interval_minutes=5, days=1, collection=None, from_
                     generate_from_local(collection=collection)
                 else:
                     db = docdb(collection=collection)
-                    db.generate(days=days)
+                    db.generate(days=days, pipeline=pipeline, workers=workers)
                     print(f"Background generate completed, sleeping for {interval_minutes} minutes")
             except Exception as e:
                 print(f"Background generate failed: {e}")
@@ -437,6 +771,7 @@ def get_last_generate_info(collection_name='default'):
         return {"last_run": None}
 
 def getOpenAIClient(base_url=None, api_key=None):
+    from openai import OpenAI
     load_dotenv()
     base_url = base_url or os.getenv('MU2E_CHAT_BASE_URL', 'http://localhost:55019/v1')
     api_key = api_key or os.getenv('MU2E_CHAT_API_KEY', 'whatever+random')
@@ -0,0 +1,64 @@
+"""
+Shared HTTP transport: pooled keep-alive requests sessions with timeouts and retries.
+"""
+
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request that doesn't set one."""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_session(pool_size=None, timeout=None, retries=None, backoff=None,
+                 status_forcelist=(500, 502, 503, 504), allowed_methods=None):
+    """
+    Create a requests.Session with connection pooling, keep-alive, default timeouts and retries.
+
+    Args:
+        pool_size (int, optional): connections kept alive per host. Defaults to MU2E_HTTP_POOL_SIZE or 10.
+        timeout (float, optional): default (connect and read) timeout in seconds. Defaults to MU2E_HTTP_TIMEOUT or 60.
+        retries (int, optional): retries on connection errors and status_forcelist responses. Defaults to MU2E_HTTP_RETRIES or 3.
+        backoff (float, optional): exponential backoff factor in seconds. Defaults to MU2E_HTTP_BACKOFF or 0.5.
+        status_forcelist (tuple): response codes that are retried
+        allowed_methods (iterable, optional): methods that are retried, defaults to the idempotent ones (no POST)
+
+    Returns:
+        requests.Session
+    """
+    pool_size = pool_size or int(os.getenv('MU2E_HTTP_POOL_SIZE', '10'))
+    timeout = timeout or float(os.getenv('MU2E_HTTP_TIMEOUT', '60'))
+    retries = retries if retries is not None else int(os.getenv('MU2E_HTTP_RETRIES', '3'))
+    backoff = backoff if backoff is not None else float(os.getenv('MU2E_HTTP_BACKOFF', '0.5'))
+
+    retry_kwargs = {}
+    if allowed_methods is not None:
+        retry_kwargs['allowed_methods'] = frozenset(allowed_methods)
+    retry = Retry(total=retries,
+                  connect=retries,
+                  read=retries,
+                  status=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=status_forcelist,
+                  raise_on_status=False,
+                  respect_retry_after_header=True,
+                  **retry_kwargs)
+    adapter = TimeoutHTTPAdapter(pool_connections=pool_size,
+                                 pool_maxsize=pool_size,
+                                 max_retries=retry,
+                                 timeout=timeout)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -10,7 +10,11 @@ if version.parse(sqlite3.sqlite_version) < version.parse("3.35.0"):
     __import__('pysqlite3')
     import sys
     sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-import chromadb
+
+# collection types available in collections.get_collection
+collection_names = ["default",
+                    "argo",
+                    "multi-qa"]
 
 def get_log_dir():
     log_dir = os.getenv('MU2E_LOG_DIR')
@@ -186,4 +190,29 @@ def getOpenAIClientForImages():
     return OpenAI(
         base_url=base_url,
         api_key=api_key
-    )
\ No newline at end of file
+    )
+
+def rss_mb(pid=None):
+    """Resident memory of a process (default: this one) in MB (Linux only, None elsewhere)."""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def index_size_mb(collection):
+    """Size of the HNSW index (vector segment directory) of a collection in MB, None if it can't be determined."""
+    try:
+        path = Path(get_chroma_path())
+        conn = sqlite3.connect(path / "chroma.sqlite3")
+        try:
+            rows = conn.execute("SELECT id FROM segments WHERE collection=? AND scope='VECTOR'",
+                                (str(collection.id),)).fetchall()
+        finally:
+            conn.close()
+        size = sum(f.stat().st_size for (segment,) in rows
+                   for f in (path / segment).rglob('*') if f.is_file())
+        return size / 1024**2
+    except (OSError, sqlite3.Error):
+        return None
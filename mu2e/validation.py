@@ -213,7 +213,12 @@ Format the response as a JSON object with this structure:
 
         with open(output_path, 'r') as file:
             d = json.load(file)
-            for entry in d:
+            col = get_collection(collection)
+            # all questions are embedded and searched in a few batched calls
+            all_results = search.search_many([entry['question'] for entry in d], collection=col,
+                                             n_results=num_results, include_metadata=False,
+                                             include_documents=False)
+            for entry, results in zip(d, all_results):
                 question = entry['question']
                 doc_id = entry['doc_id']
                 question_id = entry['question_id']
@@ -221,10 +226,6 @@ Format the response as a JSON object with this structure:
                 print("Question:", question)
                 print("ID:", question_id)
 
-                col = get_collection(collection)
-                
-                results = search.search(query=question, collection=col, n_results=num_results)
-
 
                 distances = results['distances']
         
@@ -289,22 +290,24 @@ Format the response as a JSON object with this structure:
 
         with open(output_path, 'r') as file:
             d = json.load(file)
+            entries = []
             for entry in d:
-                qa_pairs = entry.get("qa_pairs", [])
-        
                 try:
-                    question = entry['qa_pairs'][question_num]['question']
+                    entries.append((entry, entry['qa_pairs'][question_num]['question']))
                 except (IndexError, KeyError, TypeError):
                     continue
-                    
+            col = get_collection(collection)
+            # all questions are embedded and searched in a few batched calls
+            all_results = search.search_many([question for _, question in entries], collection=col,
+                                             n_results=num_results, include_metadata=False,
+                                             include_documents=False)
+            for (entry, question), results in zip(entries, all_results):
                 doc_id = entry['doc_id']
                 question_id = entry['question_id']
 
                 print("Question:", question)
                 print("ID:", question_id)
 
-                col = get_collection(collection)
-                results = search.search(query=question, collection=col, n_results=num_results)
                 distances = results['distances']
 
 
@@ -339,6 +342,72 @@ Format the response as a JSON object with this structure:
     
     
  
+    def check_retrieval_exact(self, collection, filename='benchmark_questions', question_num=None,
+                              ks=(1, 5, 10, 20, 100), hnsw_k=10, float16=False):
+        """
+        Exact version of check_retrieval/check_chATLAS (see mu2e.evaluation): the embeddings of the
+        collection are exported once and the rank of every target document is computed with NumPy.
+        Prints MRR, recall@k and the recall of Chroma's approximate (HNSW) search.
+
+        Args:
+            collection (str): collection name
+            filename (str): questions file in the data directory
+            question_num (int, optional): use entry['qa_pairs'][question_num]['question'] (chATLAS questions)
+            ks (tuple): k values of recall@k
+            hnsw_k (int): number of nearest chunks compared with the approximate search, 0 to skip
+            float16 (bool): store the embeddings as float16 (half the memory)
+
+        Returns:
+            (pd.DataFrame, dict): distance, position (chunk rank, 0 based) and doc_rank per question, and the metrics
+        """
+        import numpy as np
+        import time
+        from .evaluation import ExactIndex
+
+        base = utils.get_data_dir()
+        with open(base / f'{filename}.json', 'r') as file:
+            d = json.load(file)
+        entries = []
+        for entry in d:
+            try:
+                question = entry['question'] if question_num is None else entry['qa_pairs'][question_num]['question']
+            except (IndexError, KeyError, TypeError):
+                continue
+            entries.append((entry, question))
+
+        start = time.time()
+        index = ExactIndex(get_collection(collection), dtype=np.float16 if float16 else np.float32)
+        export_s = time.time() - start
+        start = time.time()
+        query_embeddings = index.embed([question for _, question in entries])
+        embed_s = time.time() - start
+        start = time.time()
+        ranks = index.rank(query_embeddings, [entry['doc_id'] for entry, _ in entries])
+        rank_s = time.time() - start
+
+        metrics = ExactIndex.metrics(ranks['doc_rank'], ks)
+        metrics['chunk_mrr'] = ExactIndex.metrics(ranks['chunk_rank'], ())['mrr']
+        if hnsw_k:
+            metrics[f'hnsw_recall@{hnsw_k}'] = index.hnsw_recall(query_embeddings, k=hnsw_k)
+        print(f"{len(index.ids)} chunks of {len(index.doc_ids)} documents ({index.space}, "
+              f"{index.nbytes / 1024**2:.1f} MB), export {export_s:.1f}s, embed {embed_s:.1f}s, rank {rank_s:.2f}s")
+        for key, value in metrics.items():
+            print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+
+        data = []
+        index_ = []
+        for (entry, question), chunk_rank, doc_rank, distance in zip(entries, ranks['chunk_rank'],
+                                                                   ranks['doc_rank'], ranks['distance']):
+            found = np.isfinite(chunk_rank)
+            position = int(chunk_rank) - 1 if found else -1
+            data.append([float(distance), position, int(doc_rank)] if found else ["Not Found", -1, -1])
+            index_.append(entry['question_id'])
+            score = (1 - position * (1 / 100)) if (found and position < 100) else 0
+            self.score_data.append({"question": question, "score": score})
+
+        return pd.DataFrame(data, index=index_, columns=['distance', 'position', 'doc_rank']), metrics
+
+
     def save_retrieval(self, collection, filename='benchmark_scores'):
 
         base = utils.get_data_dir()
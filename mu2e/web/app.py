@@ -13,7 +13,7 @@ from mu2e.chat_mcp import MCPClient,Chat
 import json
 from datetime import datetime, timedelta
 from mu2e.tools import load2, getOpenAIClient, start_background_generate, get_last_generate_info
-from mu2e.search import search, search_fulltext, search_list, parse_web_filters
+from mu2e.search import search, search_fulltext, search_hybrid, search_documents, search_reranked, search_many, search_list, parse_web_filters
 from mu2e.utils import list_to_search_result, get_log_dir
 from mu2e.collections import get_collection, collection_names
 from mu2e import docdb, collections
@@ -79,9 +79,14 @@ def search_api():
         filters = data.get('filters', None)
         date_after = data.get('date_after', None)
         date_before = data.get('date_before', None)
+        max_chunks_per_doc = data.get('max_chunks_per_doc', None)
+        rerank = data.get('rerank', False)
+        queries = data.get('queries', None)
         search_id = str(uuid.uuid4())
 
-        if type != 'list' and not query:
+        if queries is not None and (type != 'search' or not isinstance(queries, list)):
+            return jsonify({'error': "'queries' has to be a list and needs type 'search'"}), 400
+        if type != 'list' and not query and not queries:
             return jsonify({'error': 'Query is required'}), 400
         
         collection = get_collection(collection_name)
@@ -109,7 +114,31 @@ def search_api():
                 date_range['end'] = date_before
 
         #print(type)
-        if type == 'search':
+        if queries:
+            # several queries in batched calls, one result per query
+            results = {'results': search_many(queries,
+                                              collection=collection,
+                                              n_results=n_results,
+                                              filters=parsed_filters,
+                                              date_range=date_range)}
+        elif max_chunks_per_doc and type in ('search', 'hybrid', 'fulltext'):
+            # n_results distinct documents
+            results = search_documents(query,
+                                       collection=collection,
+                                       n_results=n_results,
+                                       max_chunks_per_doc=max_chunks_per_doc,
+                                       mode='vector' if type == 'search' else type,
+                                       rerank=rerank,
+                                       filters=parsed_filters,
+                                       date_range=date_range)
+        elif rerank and type in ('search', 'hybrid', 'fulltext'):
+            results = search_reranked(query,
+                                      collection=collection,
+                                      n_results=n_results,
+                                      mode='vector' if type == 'search' else type,
+                                      filters=parsed_filters,
+                                      date_range=date_range)
+        elif type == 'search':
             results = search(query, 
                             collection=collection,
                             n_results=n_results, 
@@ -121,6 +150,12 @@ def search_api():
                                       n_results=n_results, 
                                       filters=parsed_filters,
                                       date_range=date_range)
+        elif type == 'hybrid':
+            results = search_hybrid(query,
+                                    collection=collection,
+                                    n_results=n_results,
+                                    filters=parsed_filters,
+                                    date_range=date_range)
         elif type == 'list':
             results = search_list(days=n_results, enhence=2)
 
@@ -197,6 +232,19 @@ def get_generate_info():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats')
+def get_stats():
+    """Load time and memory of the loaded collections and embedding models, query and re-ranker caches"""
+    try:
+        from mu2e.rerank import get_reranker
+        from mu2e.query_cache import get_query_cache
+        query_cache = get_query_cache()
+        return jsonify({**collections.registry_stats(),
+                        'query_cache': query_cache.stats() if query_cache else None,
+                        'rerank': get_reranker().stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/extract-filters', methods=['POST'])
 def extract_filters():
     """Extract search filters from natural language query using LLM"""
@@ -293,26 +341,23 @@ def trigger_generate():
             from mu2e.tools import generate_from_local
             add_image_descriptions = should_add_image_descriptions()
             
-            # Always use default collection first (downloads from DocDB)
+            # every document is downloaded and parsed once and stored in all collections
             db = docdb()
+            collections = [get_collection(cn) for cn in collection_names]
             
             if docid:
                 # Regenerate specific document
-                db.get_parse_store(docid, save_raw=True, add_image_descriptions=add_image_descriptions)
-                # Then generate other collections from local cache for this specific document
-                for cn in collection_names:
-                    if cn not in ["default"]:
-                        collection = get_collection(cn)
-                        generate_from_local(collection=collection, docid=docid)
+                db.get_parse_store(docid, save_raw=True, add_image_descriptions=add_image_descriptions,
+                                   collections=collections)
             else:
                 # Bulk generate recent documents
-                db.generate(days=1, add_image_descriptions=add_image_descriptions)
-                # Then generate other collections from local cache (all documents)
-                for cn in collection_names:
-                    if cn not in ["default"]:
-                        collection = get_collection(cn)
-                        generate_from_local(collection=collection)
-        
+                db.generate(days=1, add_image_descriptions=add_image_descriptions, collections=collections)
+                # Then backfill the other collections from the local documents (all documents, in one pass;
+                # documents a collection already has in the current version are skipped)
+                others = [c for cn, c in zip(collection_names, collections) if cn not in ["default"]]
+                if others:
+                    generate_from_local(collections=others)
+
         # Run in background thread
         import threading
         threading.Thread(target=run_generate, daemon=True).start()
@@ -464,6 +509,17 @@ def main():
     #start_background_generate(interval_minutes=5, days=1)
     #start_background_generate(interval_minutes=5, days=1, from_local=True,)
     
+    # Load the collections and embedding models before the first search
+    stats = collections.warmup()
+    for c in stats['collections']:
+        print(f"Loaded {c['type']} collection in {c['load_s'] + c.get('warmup_s', 0):.1f}s")
+    
+    # Image descriptions of newly stored documents are generated in the background
+    from mu2e.utils import should_add_image_descriptions
+    from mu2e.enrichment import defer_image_descriptions, start_enrichment_worker
+    if should_add_image_descriptions() and defer_image_descriptions():
+        start_enrichment_worker()
+    
     print(f"Starting Mu2e DocDB Web Interface on http://127.0.0.1:{args.port}")
     socketio.run(app, debug=True, host='127.0.0.1', port=args.port)
 